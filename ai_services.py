@@ -0,0 +1,144 @@
+from ollama_integration import generate_full_survey_with_options, stream_generate, json_fence_closed
+from llm_cache import cached_call, cached_stream
+from llm_clients import get_openai_client, get_anthropic_client
+from survey_schema import SURVEY_SCHEMA, SURVEY_TOOL
+from metrics import increment, instrument_stream, record_tokens, timed
+from prompt_templates import prompt_text, split_prompt
+import json
+
+SERVICES = ["Ollama (Local)", "OpenAI (ChatGPT)", "Claude (Anthropic)"]
+BACKEND_NAMES = {"Ollama (Local)": "ollama", "OpenAI (ChatGPT)": "openai", "Claude (Anthropic)": "anthropic"}
+
+
+class ConfigurationError(RuntimeError):
+    # Problème propre à la session (clé absente), pas au backend
+    pass
+
+
+def is_configuration_error(error):
+    # Clé manquante, refusée ou sans droits (401/403) : l'erreur vient de la session, pas de la santé du backend
+    return isinstance(error, ConfigurationError) or getattr(error, "status_code", None) in (401, 403)
+
+# Modèles et paramètres d'échantillonnage (utilisés aussi comme clé de cache)
+OPENAI_MODEL = "gpt-4o"  # les sorties structurées (json_schema) nécessitent gpt-4o ou plus récent
+OPENAI_PARAMS = {"temperature": 0.7}
+CLAUDE_MODEL = "claude-3-opus-20240229"  # ou un autre modèle Claude
+CLAUDE_PARAMS = {"max_tokens": 4096}  # 1000 tronquait les questionnaires très détaillés
+
+# Sorties structurées : le schéma du questionnaire est imposé au modèle
+OPENAI_STRUCTURED = {
+    "response_format": {"type": "json_schema", "json_schema": {"name": "survey", "schema": SURVEY_SCHEMA, "strict": True}}
+}
+CLAUDE_STRUCTURED = {
+    "tools": [SURVEY_TOOL],
+    "tool_choice": {"type": "tool", "name": SURVEY_TOOL["name"]}
+}
+
+# Le préfixe statique du prompt part en message système : OpenAI le met en cache automatiquement,
+# Anthropic à partir du point de contrôle cache_control. La partie variable reste le message utilisateur.
+def openai_messages(prompt):
+    system, user = split_prompt(prompt)
+    return ([{"role": "system", "content": system}] if system else []) + [{"role": "user", "content": user}]
+
+def claude_request(prompt):
+    system, user = split_prompt(prompt)
+    request = {"messages": [{"role": "user", "content": user}]}
+    if system:
+        request["system"] = [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}]
+    return request
+
+def openai_cached_tokens(usage):
+    details = getattr(usage, "prompt_tokens_details", None)
+    return getattr(details, "cached_tokens", None)
+
+# API historique, sans flux : une requête, une réponse complète. L'application, le lot en ligne de commande
+# et les traductions passent par llm_router (flux, repli, cache vérifié) ; elle reste disponible pour les
+# intégrations existantes et sert de référence dans benchmarks/test_generation.py. Ses mesures de durée
+# (call_ai_service, generate_full_survey_with_options) ne concernent donc que ces appels directs.
+def call_ai_service(prompt, service, api_key=None, use_cache=True, structured=True):
+    with timed("call_ai_service", backend=BACKEND_NAMES.get(service, service)):
+        return _call_ai_service(prompt, service, api_key, use_cache, structured)
+
+def _call_ai_service(prompt, service, api_key, use_cache, structured):
+    client_openai = get_openai_client(api_key) if service == "OpenAI (ChatGPT)" else None
+    client_claude = get_anthropic_client(api_key) if service == "Claude (Anthropic)" else None
+    if service == "Ollama (Local)":
+        return generate_full_survey_with_options(prompt, use_cache=use_cache)
+    elif service == "OpenAI (ChatGPT)" and client_openai:
+        params = dict(OPENAI_PARAMS, **(OPENAI_STRUCTURED if structured else {}))
+        def generate():
+            response = client_openai.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=openai_messages(prompt),
+                **params
+            )
+            if response.usage:
+                record_tokens("openai", response.usage.prompt_tokens, response.usage.completion_tokens, openai_cached_tokens(response.usage))
+            return response.choices[0].message.content
+        return cached_call("openai", OPENAI_MODEL, prompt_text(prompt), params, generate, use_cache=use_cache)
+    elif service == "Claude (Anthropic)" and client_claude:
+        params = dict(CLAUDE_PARAMS, **(CLAUDE_STRUCTURED if structured else {}))
+        def generate():
+            response = client_claude.messages.create(
+                model=CLAUDE_MODEL,
+                **claude_request(prompt),
+                **params
+            )
+            record_tokens("anthropic", response.usage.input_tokens, response.usage.output_tokens, getattr(response.usage, "cache_read_input_tokens", None))
+            # Avec l'outil imposé, le questionnaire arrive déjà structuré dans le bloc tool_use
+            for block in response.content:
+                if block.type == "tool_use":
+                    return json.dumps(block.input, ensure_ascii=False)
+            return response.content[0].text
+        return cached_call("anthropic", CLAUDE_MODEL, prompt_text(prompt), params, generate, use_cache=use_cache)
+    else:
+        increment("survey_generation_failures_total", backend=BACKEND_NAMES.get(service, service), reason="not_configured")
+        return "Error: Service not configured properly."
+
+# Génération en flux : renvoie les tokens au fur et à mesure pour les trois services
+def stream_ai_service(prompt, service, api_key=None, use_cache=True, structured=False, validate=None):
+    # validate(text) : seule une réponse qui passe la vérification est mise en cache
+    client_openai = get_openai_client(api_key) if service == "OpenAI (ChatGPT)" else None
+    client_claude = get_anthropic_client(api_key) if service == "Claude (Anthropic)" else None
+    if service == "Ollama (Local)":
+        yield from stream_generate(prompt, use_cache=use_cache, structured=structured, validate=validate)
+    elif service == "OpenAI (ChatGPT)" and client_openai:
+        params = dict(OPENAI_PARAMS, **(OPENAI_STRUCTURED if structured else {}))
+        def stream():
+            chunks = client_openai.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=openai_messages(prompt),
+                stream=True,
+                stream_options={"include_usage": True},
+                **params
+            )
+            for chunk in instrument_stream(chunks, "openai"):
+                if chunk.usage:
+                    record_tokens("openai", chunk.usage.prompt_tokens, chunk.usage.completion_tokens, openai_cached_tokens(chunk.usage))
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        yield from cached_stream("openai", OPENAI_MODEL, prompt_text(prompt), params, stream, use_cache=use_cache, complete=json_fence_closed, validate=validate)
+    elif service == "Claude (Anthropic)" and client_claude:
+        params = dict(CLAUDE_PARAMS, **(CLAUDE_STRUCTURED if structured else {}))
+        def stream():
+            events = client_claude.messages.create(
+                model=CLAUDE_MODEL,
+                **claude_request(prompt),
+                stream=True,
+                **params
+            )
+            for event in instrument_stream(events, "anthropic"):
+                if event.type == "message_start":
+                    usage = event.message.usage
+                    record_tokens("anthropic", prompt_tokens=usage.input_tokens, cached_tokens=getattr(usage, "cache_read_input_tokens", None))
+                elif event.type == "message_delta":
+                    record_tokens("anthropic", completion_tokens=event.usage.output_tokens)
+                if event.type != "content_block_delta":
+                    continue
+                if event.delta.type == "text_delta":
+                    yield event.delta.text
+                elif event.delta.type == "input_json_delta":  # arguments de l'outil, JSON partiel
+                    yield event.delta.partial_json
+        yield from cached_stream("anthropic", CLAUDE_MODEL, prompt_text(prompt), params, stream, use_cache=use_cache, complete=json_fence_closed, validate=validate)
+    else:
+        raise ConfigurationError("Error: Service not configured properly.")
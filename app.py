@@ -1,45 +1,52 @@
 import streamlit as st
 import json
-import pandas as pd
-from ollama_integration import generate_question_list, generate_full_survey_with_options
+from ai_services import SERVICES
+from survey_prompts import LANGUAGES, DETAIL_LEVELS, TONES, STANDARDS, build_outline_prompt, build_survey_prompt
+from llm_cache import get_cache
+from generation_engine import get_engine
+from llm_router import get_router
+import metrics
+from sectioned_generation import build_section_prompts, merge_sections
+from prompt_templates import prompt_stats
+from survey_model import Survey
+from survey_validation import check_consistency, format_issues, revalidate_survey, survey_hash, validate_survey
+from incremental_generation import build_regeneration_prompts, plan_regeneration, splice_survey
+from survey_store import get_store
+from survey_translation import collect_translation, submit_translation
+from question_bank import find_duplicates, get_bank, remove_duplicates
+from survey_simulation import DISTRIBUTIONS, simulate_survey
+from survey_export import EXPORT_FORMATS, LAYOUTS, export_survey, export_translations, header, iter_parallel_rows, iter_rows, max_options, parallel_header
 import os
 import time
-import threading
-import io
-import re
-from openai import OpenAI  # Pour l'API OpenAI
-import anthropic  # Pour l'API Claude
-
-# Gestion multilingue
-LANGUAGES = {"Français": "French", "English": "English", "Español": "Spanish", "العربية": "Arabic"}
-DETAIL_LEVELS = {"basic": "basic", "detailed": "detailed", "very_detailed": "very detailed"}
-TONES = {"formal": "formal", "friendly": "friendly", "neutral": "neutral"}
-
-# Standards internationaux
-STANDARDS = {
-    "ISO 20252": "Ensure clarity, transparency, and consistency in question design.",
-    "AAPOR": "Minimize bias, ensure clarity, and pretest questions for reliability.",
-    "ESS": "Ensure cross-cultural comparability and rigorous pretesting.",
-    "OCDE": "Focus on psychometric validity and international comparability.",
-    "ESOMAR": "Respect respondent privacy and avoid intrusive questions."
-}
-
-# Chargement des traductions
-translation_files = {}
-for lang, code in LANGUAGES.items():
-    file_path = f"translations/{code.lower()[:2]}.json"  # ex. "fr.json" pour "French"
-    try:
-        with open(file_path, encoding="utf-8") as f:
-            translation_files[code] = json.load(f)
-    except Exception as e:
-        st.error(f"Error with {file_path}: {str(e)}")
-        translation_files[code] = {}
+
+# Chargement des traductions (une seule fois par processus, pas à chaque relance du script)
+@st.cache_resource
+def load_translations():
+    translation_files = {}
+    errors = []
+    for lang, code in LANGUAGES.items():
+        file_path = f"translations/{code.lower()[:2]}.json"  # ex. "fr.json" pour "French"
+        try:
+            with open(file_path, encoding="utf-8") as f:
+                translation_files[code] = json.load(f)
+        except Exception as e:
+            errors.append(f"Error with {file_path}: {str(e)}")
+            translation_files[code] = {}
+    return translation_files, errors
+
+translation_files, translation_errors = load_translations()
+for error in translation_errors:
+    st.error(error)
 
 # Initialisation de l’état
 if "questions_raw" not in st.session_state:
     st.session_state.questions_raw = ""
 if "survey" not in st.session_state:
-    st.session_state.survey = {"intro": "", "questions": [], "outro": ""}
+    st.session_state.survey = Survey()  # normalisé une fois à la réception (survey_model)
+if "survey_id" not in st.session_state:
+    st.session_state.survey_id = None  # identifiant du questionnaire dans l'historique (survey_store)
+if "survey_outline" not in st.session_state:
+    st.session_state.survey_outline = ""  # plan à partir duquel le questionnaire affiché a été généré
 if "config_params" not in st.session_state:
     st.session_state.config_params = {}
 
@@ -52,112 +59,136 @@ st.title(tr.get("survey_generator", "Survey Generator"))
 # Choix du service AI
 ai_service = st.sidebar.selectbox(
     "AI Service",
-    ["Ollama (Local)", "OpenAI (ChatGPT)", "Claude (Anthropic)"],
+    SERVICES,
     help="Select the AI service to generate the survey."
 )
 
-# Configuration des clés API si nécessaire
+# Configuration des clés API si nécessaire (les clients sont mutualisés dans llm_clients)
+if "api_keys" not in st.session_state:
+    st.session_state.api_keys = {}
 if ai_service == "OpenAI (ChatGPT)":
     openai_api_key = st.sidebar.text_input("OpenAI API Key", type="password")
     if not openai_api_key:
         st.warning("Please enter your OpenAI API key.")
-    client_openai = OpenAI(api_key=openai_api_key) if openai_api_key else None
+    st.session_state.api_keys[ai_service] = openai_api_key
 elif ai_service == "Claude (Anthropic)":
     claude_api_key = st.sidebar.text_input("Claude API Key", type="password")
     if not claude_api_key:
         st.warning("Please enter your Claude API key.")
-    client_claude = anthropic.Anthropic(api_key=claude_api_key) if claude_api_key else None
-
-# Fonction pour appeler le service AI
-def call_ai_service(prompt, service):
-    if service == "Ollama (Local)":
-        return generate_full_survey_with_options(prompt)
-    elif service == "OpenAI (ChatGPT)" and client_openai:
-        response = client_openai.chat.completions.create(
-            model="gpt-4",  # ou "gpt-3.5-turbo" selon votre abonnement
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7
-        )
-        return response.choices[0].message.content
-    elif service == "Claude (Anthropic)" and client_claude:
-        response = client_claude.messages.create(
-            model="claude-3-opus-20240229",  # ou un autre modèle Claude
-            max_tokens=1000,
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.content[0].text
-    else:
-        return "Error: Service not configured properly."
-
-# Fonction de vérification de cohérence (déplacée au niveau global)
-def check_consistency(survey):
-    issues = []
-    if not survey.get("questions") or not isinstance(survey["questions"], (list, tuple)):
-        issues.append(tr.get("no_questions", "No valid questions found in survey"))
-        return issues
-
-    for i, q in enumerate(survey["questions"]):
-        q_num = f"Q{i+1}"
-        
-        # Vérification des champs obligatoires
-        if not q.get("text") or not q.get("type"):
-            issues.append(f"{q_num}: {tr.get('missing_field', 'Missing required field (text or type)')} - {q}")
-            continue
-
-        # Vérification des options selon le type
-        q_type = q.get("type", "").lower()
-        options = q.get("options")
-        if "choice" in q_type and (options is None or not isinstance(options, (list, tuple)) or not options):
-            issues.append(f"{q_num}: {tr.get('missing_options', 'Choice question requires options')} - {q}")
-            continue
-        if "open" in q_type and options is not None:
-            issues.append(f"{q_num}: {tr.get('unexpected_options', 'Open-ended question should not have options')} - {q}")
-            continue
-
-        # Vérification des conditions
-        condition = q.get("condition")
-        if condition:
-            try:
-                if isinstance(condition, str):
-                    cond_parts = condition.split(" = ")
-                    if len(cond_parts) != 2:
-                        issues.append(f"{q_num}: {tr.get('invalid_condition_format', 'Invalid condition format')} ({condition})")
-                        continue
-                    cond_q, cond_val = cond_parts
-                elif isinstance(condition, dict):
-                    cond_q = condition.get("question", "")
-                    cond_val = condition.get("value", "")
-                    if not cond_q or not cond_val:
-                        issues.append(f"{q_num}: {tr.get('invalid_condition_dict', 'Invalid condition dictionary')} ({condition})")
-                        continue
-                else:
-                    issues.append(f"{q_num}: {tr.get('unsupported_condition_type', 'Unsupported condition type')} ({condition})")
-                    continue
+    st.session_state.api_keys[ai_service] = claude_api_key
 
-                cond_q_clean = cond_q.replace("If Q", "").strip()
-                try:
-                    cond_idx = int(cond_q_clean) - 1
-                except ValueError:
-                    issues.append(f"{q_num}: {tr.get('invalid_question_ref', 'Invalid question reference')} ({cond_q})")
-                    continue
+# Cache des réponses
+use_cache = st.sidebar.checkbox("Use response cache", value=True, help="Reuse previous answers for identical prompts and settings.")
+cache_stats = get_cache().stats()
+st.sidebar.caption(f"Cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses ({cache_stats['entries']} entries)")
 
-                if cond_idx < 0 or cond_idx >= len(survey["questions"]):
-                    issues.append(f"{q_num}: {tr.get('out_of_bounds', 'Condition references out-of-bounds question')} ({cond_q})")
-                    continue
+# Routage : repli sur les autres services configurés (Ollama ou clés saisies) en cas d'échec ou de blocage
+fallback = st.sidebar.checkbox("Fall back to other services", value=True, help="If the selected service fails or stalls, retry with another configured service.")
 
-                ref_q = survey["questions"][cond_idx]
-                ref_options = ref_q.get("options", []) or []
-                ref_option_values = [str(opt).strip().lower() if isinstance(opt, (int, str)) else str(opt.get("value", opt)).strip().lower() for opt in ref_options]
-                cond_val_cleaned = str(cond_val).strip("'\"").lower()
+# Banque de questions : suggestions pour le plan et détection des doublons (embeddings Ollama)
+use_bank = st.sidebar.checkbox("Use question bank", value=False, help="Suggest validated questions from previous surveys in the outline and flag near-duplicate questions (requires an Ollama embedding model).")
+bank = get_bank() if use_bank else None
 
-                if not ref_option_values:
-                    issues.append(f"{q_num}: {tr.get('no_options_ref', 'Referenced question has no options')} (Q{cond_idx+1})")
-                elif cond_val_cleaned not in ref_option_values:
-                    issues.append(f"{q_num}: {tr.get('invalid_condition_value', 'Invalid condition value')} ({condition}) - '{cond_val}' not in Q{cond_idx+1} options: {ref_option_values}")
-            except Exception as e:
-                issues.append(f"{q_num}: {tr.get('condition_error', 'Error processing condition')} ({condition}) - {str(e)}")
+# Métriques : point de terminaison Prometheus si SURVEY_METRICS_PORT est défini, panneau d'administration optionnel
+metrics.start_metrics_server()
+if st.sidebar.checkbox("Show metrics", value=False, help="Per-stage latency, token usage and cache statistics for this server process."):
+    with st.sidebar.expander("Metrics", expanded=True):
+        import pandas as pd  # importé seulement à l'ouverture du panneau
+        snapshot = metrics.snapshot()
+        if snapshot["stages"]:
+            st.dataframe(pd.DataFrame(snapshot["stages"]))
+        if snapshot["counters"]:
+            st.dataframe(pd.DataFrame(snapshot["counters"]))
+        st.dataframe(pd.DataFrame(get_router().health_summary()).T)
+        st.download_button("Prometheus metrics", metrics.render_prometheus(), file_name="metrics.txt", mime="text/plain")
 
-    return issues
+# Historique : questionnaires enregistrés, filtrables et rechargeables sans nouvel appel au modèle
+store = get_store()
+
+def load_saved_survey(survey_id):
+    record = store.get_survey(survey_id)
+    if record is None:
+        return
+    st.session_state.config_params = record["config"]
+    st.session_state.questions_raw = record["outline"]
+    st.session_state.survey_outline = record["outline"]
+    st.session_state.survey = Survey.from_dict(record["survey"])
+    st.session_state.survey_id = record["id"]
+    st.experimental_rerun()
+
+def index_in_bank(survey, issues=None):
+    # Les questions validées du questionnaire enregistré alimentent la banque
+    if bank is None:
+        return
+    try:
+        bank.add_survey(survey, st.session_state.config_params, issues)
+    except Exception as e:
+        st.warning(f"{tr.get('bank_error', 'Question bank unavailable')}: {str(e)}")
+
+if "history_cursors" not in st.session_state:
+    st.session_state.history_cursors = [None]  # curseur de chaque page déjà affichée
+with st.sidebar.expander("History", expanded=False):
+    languages = store.distinct("language")
+    language_filter = st.selectbox("Language", [""] + languages, format_func=lambda value: value or "All", key="history_language")
+    search = st.text_input("Search entity or title", key="history_search")
+    if (language_filter, search) != st.session_state.get("history_filters"):
+        st.session_state.history_filters = (language_filter, search)
+        st.session_state.history_cursors = [None]
+    page, next_cursor = store.list_surveys(language=language_filter or None, search=search or None, before=st.session_state.history_cursors[-1])
+    for item in page:
+        label = f"{item.title or item.entity} ({item.entity}, {item.language}, {item.question_count} Q, {time.strftime('%Y-%m-%d %H:%M', time.localtime(item.created_at))})"
+        if st.button(label, key=f"history_load_{item.id}"):
+            load_saved_survey(item.id)
+    if not page:
+        st.caption("No saved surveys.")
+    previous_col, next_col = st.columns(2)
+    if len(st.session_state.history_cursors) > 1 and previous_col.button("Previous", key="history_previous"):
+        st.session_state.history_cursors.pop()
+        st.experimental_rerun()
+    if next_cursor is not None and next_col.button("Next", key="history_next"):
+        st.session_state.history_cursors.append(next_cursor)
+        st.experimental_rerun()
+
+# Moteur de génération asynchrone (partagé par toutes les sessions)
+engine = get_engine()
+if "jobs" not in st.session_state:
+    st.session_state.jobs = {}
+
+# Suivi des tâches d'une étape : affiche le texte partiel et renvoie les tâches une fois toutes terminées
+def poll_jobs(step, show_text=True):
+    jobs = [engine.get(job_id) for job_id in st.session_state.jobs.get(step, [])]
+    if not jobs or None in jobs:
+        st.session_state.jobs.pop(step, None)
+        return None
+    running = [job for job in jobs if not job.finished]
+    if running:
+        progress = f" {len(jobs) - len(running)}/{len(jobs)}" if len(jobs) > 1 else ""
+        st.caption(f"{tr.get('generating', 'Generating in progress...')}{progress} ({running[0].status})")
+        for job in running:
+            if job.text and show_text:
+                st.text(job.text)
+        if st.button(tr.get("cancel", "Cancel"), key=f"cancel_{step}"):
+            for job in running:
+                engine.cancel(job.id)
+        return None
+    del st.session_state.jobs[step]
+    return jobs
+
+# Applique une régénération partielle : insertion des parties refaites et revalidation des seules questions touchées
+def apply_regeneration(regeneration, results):
+    previous = st.session_state.survey
+    try:
+        survey, changed = splice_survey(previous.to_dict(), st.session_state.survey_outline, regeneration["plan"], results)
+    except ValueError as e:
+        st.error(str(e))
+        return
+    survey = Survey.from_dict(survey)
+    issues = revalidate_survey(survey, validate_survey(previous), changed)
+    st.session_state.survey = survey
+    st.session_state.survey_outline = regeneration["outline"]
+    st.session_state.survey_id = store.save_survey(st.session_state.config_params, regeneration["outline"], survey, st.session_state.survey_id)
+    index_in_bank(survey, issues)
+    st.success(tr.get("regenerated_message", "{count} question(s) regenerated or renumbered.").format(count=len(changed)))
 
 # Étapes avec onglets
 tabs = st.tabs([
@@ -250,57 +281,26 @@ with tabs[1]:
     else:
         if st.button(tr.get("generate_questions_button", "Generate Question List")):
             params = st.session_state.config_params
-            standards_instructions = "\n".join([f"- {standard}: {STANDARDS[standard]}" for standard in params["standards"]])
-            question_types_translated = {
-                "French": {"Choix unique": "Choix unique", "Choix multiple": "Choix multiple", "Ouvertes": "Ouvertes", "Échelles (1-5)": "Échelles (1-5)", "Conditionnelles": "Conditionnelles"},
-                "English": {"Single Choice": "Single-choice", "Multiple Choice": "Multiple-choice", "Open-ended": "Open-ended", "Scales (1-5)": "Scales (1-5)", "Conditional": "Conditional"},
-                "Spanish": {"Opción única": "Opción única", "Opción múltiple": "Opción múltiple", "Abiertas": "Abiertas", "Escalas (1-5)": "Escalas (1-5)", "Condicionales": "Condicionales"},
-                "Arabic": {"اختيار واحد": "اختيار واحد", "اختيار متعدد": "اختيار متعدد", "مفتوحة": "مفتوحة", "مقاييس (1-5)": "مقاييس (1-5)", "مشروطة": "مشروطة"}
-            }
-            # Convertir la langue du sondage en code interne (ex. "Français" -> "French")
-            survey_lang_code = LANGUAGES[params['survey_lang']]
-            translated_types = [question_types_translated[survey_lang_code].get(t, t) for t in params['question_types']]
-
-            example = (
-                "Section 1: Satisfaction\n- Comment êtes-vous satisfait ? (Ouvertes)\n- Recommanderiez-vous ? (Choix unique)\n- Si oui, pourquoi ? (Ouvertes, conditionnelle)"
-                if params['survey_lang'] == 'Français'
-                else "Section 1: Satisfaction\n- How satisfied are you? (Open-ended)\n- Would you recommend? (Single-choice)\n- If yes, why? (Open-ended, conditional)"
-            )
-
-            prompt = f"""
-            Generate a professional survey outline for '{params['entity_name']}' titled '{params['survey_title']}'.
-            Context: {params['survey_context']}.
-            Objectives: {', '.join(params['objectives'])}.
-            Sector: {params['sector']}.
-            Target audience: {', '.join(params['target_groups'])}, approximately {params['target_size']} respondents.
-            Structure: {params['sections']} sections, using {', '.join(translated_types)} question types.
-            Detail level: {params['detail_level']} (basic: 5-7 questions, detailed: 8-12, very detailed: 12+).
-            Estimated duration: {params['duration']} minutes.
-            Language: Generate all content exclusively in {params['survey_lang']}.
-            Tone: {params['tone']}.
-            Additional instructions: {params['custom_instructions'] if params['custom_instructions'] else 'None'}.
-            Standards to follow:
-            {standards_instructions}
-            Include a mix of question types and conditional logic where appropriate.
-            Output as plain text with sections and question types in parentheses, entirely in {params['survey_lang']}.
-            Example in {params['survey_lang']}:
-            {example}
-            """
-            with st.spinner(tr.get("generating", "Generating in progress...")):
-                result = [None]
-                def run_generation():
-                    try:
-                        result[0] = generate_question_list(prompt)
-                    except Exception as e:
-                        result[0] = f"Error generating: {str(e)}"
-                thread = threading.Thread(target=run_generation)
-                thread.start()
-                thread.join()
-                if result[0] and "Error" not in result[0]:
-                    st.session_state.questions_raw = result[0]
-                    st.success(tr.get("success_message", "Questions generated successfully!"))
-                else:
-                    st.error(result[0] or tr.get("error_message", "Error: No response received from the model."))
+            reuse = None
+            if bank is not None:
+                try:
+                    reuse = bank.suggest(params)
+                except Exception as e:
+                    st.warning(f"{tr.get('bank_error', 'Question bank unavailable')}: {str(e)}")
+            if reuse:
+                st.caption(tr.get("bank_suggestions", "{count} validated question(s) from the question bank suggested to the model.").format(count=len(reuse)))
+            prompt = build_outline_prompt(params, reuse=reuse)
+            st.session_state.jobs["outline"] = [engine.submit(prompt, "Ollama (Local)", kind="text", use_cache=use_cache, api_keys=st.session_state.api_keys, fallback=fallback)]
+
+        jobs = poll_jobs("outline")
+        if jobs is not None:
+            store.record_jobs(None, jobs)  # durées et prompt du plan, avant qu'un questionnaire n'existe
+            job = jobs[0]
+            if job.status == "done" and job.result:
+                st.session_state.questions_raw = job.result
+                st.success(tr.get("success_message", "Questions generated successfully!"))
+            elif job.status == "failed":
+                st.error(job.error or tr.get("error_message", "Error: No response received from the model."))
 
         if st.session_state.questions_raw:
             st.text_area(tr.get("questions_list", "Question List (editable)"), st.session_state.questions_raw, height=200)
@@ -321,151 +321,221 @@ with tabs[3]:
     if not st.session_state.config_params or not st.session_state.questions_raw:
         st.warning(tr.get("warning_complete_steps", "Please complete the previous steps (configuration and question generation)."))
     else:
+        by_sections = st.checkbox(
+            tr.get("generate_by_sections", "Generate sections in parallel"),
+            help=tr.get("generate_by_sections_help", "Generate each 'Section N:' of the outline separately and merge the results.")
+        )
+        # Même configuration et même plan déjà générés : proposer de reprendre le questionnaire enregistré
+        existing = store.find_existing(st.session_state.config_params, st.session_state.questions_raw)
+        if existing is not None and existing.id != st.session_state.survey_id:
+            st.info(tr.get("existing_survey", "A survey was already generated from this configuration and outline on {date}.").format(
+                date=time.strftime("%Y-%m-%d %H:%M", time.localtime(existing.created_at))))
+            if st.button(tr.get("load_existing_survey", "Load Saved Survey")):
+                load_saved_survey(existing.id)
         if st.button(tr.get("generate_full_survey_button", "Generate Full Survey")):
             params = st.session_state.config_params
-            standards_instructions = "\n".join([f"- {standard}: {STANDARDS[standard]}" for standard in params["standards"]])
-            # Déterminer les exigences à inclure dans l’intro
-            if params["standards"]:
-                intro_standards_text = "\n".join([f"- {standard}: {STANDARDS[standard]}" for standard in params["standards"]])
+            if by_sections:
+                prompts = build_section_prompts(params, st.session_state.questions_raw)
             else:
-                intro_standards_text = f"- ISO 20252: {STANDARDS['ISO 20252']}"
-            
-            # Construire l’intro de l’exemple avec des retours à la ligne
-            if params['survey_lang'] == 'Français':
-                example_intro = f"Merci de participer à cette enquête. Cette enquête respecte les exigences suivantes:\n- ISO 20252: Assurer clarté, transparence et cohérence dans la conception des questions."
+                prompts = [build_survey_prompt(params, st.session_state.questions_raw, structured=True)]
+            st.session_state.regeneration = {"outline": st.session_state.questions_raw, "plan": None}
+            st.session_state.jobs["survey"] = [
+                engine.submit(prompt, params["ai_service"], kind="survey", api_keys=st.session_state.api_keys, use_cache=use_cache, fallback=fallback)
+                for prompt in prompts
+            ]
+
+        # Après des modifications à l'étape 3 : seules les sections ou questions changées du plan sont régénérées
+        outline_changed = st.session_state.survey.questions and st.session_state.survey_outline and st.session_state.survey_outline != st.session_state.questions_raw
+        if outline_changed and st.button(tr.get("regenerate_changes_button", "Regenerate Changed Questions Only")):
+            params = st.session_state.config_params
+            plan = plan_regeneration(st.session_state.survey_outline, st.session_state.questions_raw, st.session_state.survey.to_dict())
+            if plan is None:
+                st.warning(tr.get("regenerate_unavailable", "The current survey cannot be matched to the outline sections. Please use Generate Full Survey."))
             else:
-                example_intro = f"Thank you for participating in this survey. This survey adheres to the following requirements:\n- ISO 20252: Ensure clarity, transparency, and consistency in question design."
-
-            prompt = f"""
-            Create a complete, professional survey from this outline:
-            {st.session_state.questions_raw}
-            Context: {params['survey_context']}.
-            Objectives: {', '.join(params['objectives'])}.
-            Sector: {params['sector']}.
-            Target audience: {', '.join(params['target_groups'])}, approximately {params['target_size']} respondents.
-            Structure: {params['sections']} sections, using {', '.join(params['question_types'])} question types.
-            Detail level: {params['detail_level']}.
-            Estimated duration: {params['duration']} minutes.
-            Language: Generate all content exclusively in {params['survey_lang']}.
-            Tone: {params['tone']}.
-            Additional instructions: {params['custom_instructions'] if params['custom_instructions'] else 'None'}.
-            Standards to follow:
-            {standards_instructions}
-            Include in the 'intro' the following requirements based on the selected standards (or ISO 20252 by default):
-            {intro_standards_text}
-            Output as a JSON object with 'intro', 'questions', and 'outro', entirely in {params['survey_lang']}.
-            For each question: include 'type', 'text', 'options' (set to null for open-ended questions), and 'condition' (e.g., "If Q2 = Yes" for question 2).
-            Multiple-choice: 4+ relevant options. Single-choice: scale (e.g., 1-5, Yes/No).
-            Wrap in ```json and ``` markers.
-            Example in {params['survey_lang']}:
-            ```json
-            {{
-                "intro": "{example_intro}",
-                "questions": [
-                    {{"type": "{ 'Choix unique' if params['survey_lang'] == 'Français' else 'Single-choice' }", "text": "{ 'Recommanderiez-vous notre service ?' if params['survey_lang'] == 'Français' else 'Would you recommend our service?' }", "options": ["Oui", "Non"], "condition": null}},
-                    {{"type": "{ 'Ouvertes' if params['survey_lang'] == 'Français' else 'Open-ended' }", "text": "{ 'Si oui, pourquoi ?' if params['survey_lang'] == 'Français' else 'If yes, why?' }", "options": null, "condition": "If Q1 = Oui"}}
-                ],
-                "outro": "{ 'Merci !' if params['survey_lang'] == 'Français' else 'Thank you!' }"
-            }}
-            """
-            with st.spinner(tr.get("generating", "Generating in progress...")):
-                result = [None]
-                def run_generation():
-                    try:
-                        result[0] = call_ai_service(prompt, params["ai_service"])
-                    except Exception as e:
-                        result[0] = f"Error generating: {str(e)}"
-                thread = threading.Thread(target=run_generation)
-                thread.start()
-                thread.join()
-                if result[0] is None:
-                    st.error(tr.get("error_message", "Error: No response received from the model."))
-                elif isinstance(result[0], str) and "Error" in result[0]:
-                    st.error(result[0])
+                prompts = build_regeneration_prompts(params, st.session_state.questions_raw, plan)
+                regeneration = {"outline": st.session_state.questions_raw, "plan": plan, "sections": [j for j, _ in prompts]}
+                if prompts:
+                    st.session_state.regeneration = regeneration
+                    st.session_state.jobs["survey"] = [
+                        engine.submit(prompt, params["ai_service"], kind="survey", api_keys=st.session_state.api_keys, use_cache=use_cache, fallback=fallback)
+                        for _, prompt in prompts
+                    ]
                 else:
-                    try:
-                        json_match = re.search(r'```json\s*(.*?)\s*```', result[0], re.DOTALL)
-                        if json_match:
-                            survey_data = json.loads(json_match.group(1))
-                        else:
-                            survey_data = json.loads(result[0])  # Fallback si pas de balises
-                        st.session_state.survey = survey_data
-                        st.success(tr.get("success_message", "Survey generated successfully!"))
-                    except json.JSONDecodeError as e:
-                        st.error(f"{tr.get('json_error', 'JSON parsing error')}: {str(e)}. Response: {result[0]}")
-                    except Exception as e:
-                        st.error(f"{tr.get('unexpected_error', 'Unexpected error')}: {str(e)}. Response: {result[0]}")
+                    # Seuls les titres ou la mise en forme ont changé : renumérotation sans appel au modèle
+                    apply_regeneration(regeneration, {})
+
+        jobs = poll_jobs("survey")
+        if jobs is not None:
+            stats = [prompt_stats(job.prompt) for job in jobs]
+            st.caption(tr.get("prompt_size", "Prompt: ~{tokens} tokens, ~{prefix_tokens} reusable by the prefix cache").format(
+                tokens=sum(stat["tokens"] for stat in stats), prefix_tokens=sum(stat["prefix_tokens"] for stat in stats)))
+            failed = [job for job in jobs if job.status == "failed"]
+            if failed:
+                store.record_jobs(None, jobs)
+                for job in failed:
+                    error = job.error or tr.get("error_message", "Error: No response received from the model.")
+                    st.error(f"{error}. Response: {job.text}" if job.text else error)
+            elif all(job.status == "done" for job in jobs):
+                served_by = sorted({job.served_by for job in jobs if job.served_by != job.service})
+                if served_by:
+                    st.info(tr.get("served_by", "Answered by {services} (fallback)").format(services=", ".join(served_by)))
+                regeneration = st.session_state.pop("regeneration", None) or {"outline": st.session_state.questions_raw, "plan": None}
+                if regeneration["plan"] is not None:
+                    apply_regeneration(regeneration, dict(zip(regeneration["sections"], [job.result for job in jobs])))
+                else:
+                    st.session_state.survey = Survey.from_dict(merge_sections([job.result for job in jobs]) if len(jobs) > 1 else jobs[0].result)
+                    st.session_state.survey_outline = regeneration["outline"]
+                    st.session_state.survey_id = store.save_survey(st.session_state.config_params, regeneration["outline"], st.session_state.survey)
+                    index_in_bank(st.session_state.survey)
+                    st.success(tr.get("success_message", "Survey generated successfully!"))
+                store.record_jobs(st.session_state.survey_id, jobs)
 
         # Affichage et exportation
-        if st.session_state.survey.get("questions"):
-            issues = check_consistency(st.session_state.survey)
+        survey = st.session_state.survey
+        if survey.questions:
+            issues = check_consistency(st.session_state.survey, tr)
             if issues:
                 st.warning(f"{tr.get('issues_detected', 'Issues detected')}:\n" + "\n".join(issues))
 
+            # Doublons sémantiques (calculés une fois par version du questionnaire)
+            if bank is not None:
+                key = survey_hash(st.session_state.survey)
+                if st.session_state.get("duplicates", (None, []))[0] != key:
+                    try:
+                        st.session_state.duplicates = (key, find_duplicates(st.session_state.survey, bank))
+                    except Exception as e:
+                        st.session_state.duplicates = (key, [])
+                        st.warning(f"{tr.get('bank_error', 'Question bank unavailable')}: {str(e)}")
+                duplicates = st.session_state.duplicates[1]
+                if duplicates:
+                    st.warning(f"{tr.get('duplicates_detected', 'Near-duplicate questions')}:\n" + "\n".join(
+                        f"Q{i+1} ≈ Q{kept+1} ({score:.2f})" for i, kept, score in duplicates))
+                    if st.button(tr.get("remove_duplicates", "Remove Duplicates")):
+                        st.session_state.survey = remove_duplicates(st.session_state.survey, duplicates)
+                        st.session_state.survey_id = store.save_survey(st.session_state.config_params, st.session_state.survey_outline,
+                                                                       st.session_state.survey, st.session_state.survey_id)
+                        st.experimental_rerun()
+
             st.subheader(tr.get("generated_survey", "Generated Survey"))
-            st.write(f"{tr.get('introduction', 'Introduction')}: {st.session_state.survey['intro']}")
-            for i, q in enumerate(st.session_state.survey["questions"]):
-                condition = f" ({tr.get('condition', 'Condition')}: {q['condition']})" if q.get("condition") else ""
-                st.write(f"{i+1}. {q['text']} ({q['type']}{condition})")
-                if q.get("options"):
-                    options = q.get("options")
-                    if options and isinstance(options[0], dict):
-                        option_texts = [opt.get("value", str(opt)) for opt in options]
-                    else:
-                        option_texts = options or []
-                    st.write(f"{tr.get('options', 'Options')}: " + ", ".join(str(opt) for opt in option_texts))
-            st.write(f"{tr.get('conclusion', 'Conclusion')}: {st.session_state.survey['outro']}")
+            st.write(f"{tr.get('introduction', 'Introduction')}: {survey.intro}")
+            for i, q in enumerate(survey.questions):
+                condition = f" ({tr.get('condition', 'Condition')}: {q.condition})" if q.condition else ""
+                st.write(f"{i+1}. {q.text} ({q.type}{condition})")
+                if q.options:
+                    st.write(f"{tr.get('options', 'Options')}: " + ", ".join(q.options))
+            st.write(f"{tr.get('conclusion', 'Conclusion')}: {survey.outro}")
 
             # Exportation corrigée
-            export_format = st.selectbox(tr.get("export_label", "Export Format"), ["JSON", "Excel", "CSV"])
-            df = pd.DataFrame()  # Initialisation par défaut
+            export_format = st.selectbox(tr.get("export_label", "Export Format"), list(EXPORT_FORMATS))
             if export_format == "JSON":
-                st.json(st.session_state.survey)
+                st.json(survey.to_dict())
             else:
-                df = pd.DataFrame(st.session_state.survey["questions"])
-                st.dataframe(df)
+                layout = st.radio(
+                    tr.get("options_layout", "Options layout"), LAYOUTS, horizontal=True,
+                    format_func=lambda value: tr.get(f"layout_{value}", {"wide": "One column per option", "long": "One row per option"}[value])
+                )
+                # Aperçu construit à partir des mêmes lignes que l'export (pandas importé à la demande)
+                import pandas as pd
+                st.dataframe(pd.DataFrame(iter_rows(st.session_state.survey, layout), columns=header(layout, max_options(st.session_state.survey))))
 
             if st.button(tr.get("export_button", "Export")):
                 try:
-                    if export_format == "JSON":
-                        json_str = json.dumps(st.session_state.survey, ensure_ascii=False, indent=2)
-                        json_bytes = json_str.encode('utf-8')
-                        st.download_button(
-                            label=tr.get("download", "Download"),
-                            data=json_bytes,
-                            file_name="survey.json",
-                            mime="application/json",
-                            key="download_json"
-                        )
-                    elif export_format == "Excel":
-                        if df.empty:
-                            df = pd.DataFrame(st.session_state.survey["questions"])
-                        output = io.BytesIO()
-                        df.to_excel(output, index=False, engine='openpyxl')
-                        output.seek(0)
-                        st.download_button(
-                            label=tr.get("download", "Download"),
-                            data=output,
-                            file_name="survey.xlsx",
-                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                            key="download_excel"
-                        )
-                    elif export_format == "CSV":
-                        if df.empty:
-                            df = pd.DataFrame(st.session_state.survey["questions"])
-                        output = io.StringIO()
-                        df.to_csv(output, index=False)
-                        csv_bytes = output.getvalue().encode('utf-8')
-                        output.close()
-                        st.download_button(
-                            label=tr.get("download", "Download"),
-                            data=csv_bytes,
-                            file_name="survey.csv",
-                            mime="text/csv",
-                            key="download_csv"
-                        )
+                    file_name, mime = EXPORT_FORMATS[export_format]
+                    st.download_button(
+                        label=tr.get("download", "Download"),
+                        data=export_survey(st.session_state.survey, export_format, layout=layout if export_format != "JSON" else "wide"),
+                        file_name=file_name,
+                        mime=mime,
+                        key=f"download_{export_format.lower()}"
+                    )
                     st.success(tr.get("export_success", "File ready for download!"))
                 except ImportError as e:
                     st.error(f"{tr.get('export_error', 'Export failed')}: Missing dependency (e.g., 'openpyxl' for Excel). Install it with 'pip install openpyxl'. Error: {str(e)}")
                 except Exception as e:
                     st.error(f"{tr.get('export_error', 'Export failed')}: {str(e)}")
+
+            # Prétest : répondants simulés à travers la logique de saut (parcours, questions inatteignables, durée réelle)
+            with st.expander(tr.get("pretest", "Pretest simulation"), expanded=False):
+                params = st.session_state.config_params
+                target = params.get("target_size", 100)
+                sim_respondents = st.number_input(tr.get("sim_respondents", "Simulated respondents"), min_value=100, max_value=10000000, value=max(100, target), step=1000)
+                sim_distribution = st.selectbox(tr.get("sim_distribution", "Answer distribution"), DISTRIBUTIONS,
+                                                format_func=lambda value: tr.get(f"distribution_{value}", {"uniform": "Uniform", "varied": "Varied (random weights)"}[value]))
+                sim_skip = st.slider(tr.get("sim_skip_rate", "Item nonresponse rate"), min_value=0.0, max_value=0.5, value=0.0, step=0.01)
+                sim_multi = st.slider(tr.get("sim_multi_rate", "Multiple-choice selection rate"), min_value=0.05, max_value=0.95, value=0.3, step=0.05)
+                sim_key = (survey_hash(st.session_state.survey), int(sim_respondents), sim_distribution, sim_skip, sim_multi, target, params.get("duration"))
+                if st.button(tr.get("run_simulation", "Run Simulation")):
+                    with st.spinner(tr.get("simulating", "Simulating respondents...")):
+                        report = simulate_survey(st.session_state.survey, int(sim_respondents), target, params.get("duration"), sim_distribution,
+                                                 multi_rate=sim_multi, skip_rate=sim_skip, seed=0)
+                        st.session_state.simulation = (sim_key, report)
+                simulation = st.session_state.get("simulation")
+                if simulation and simulation[0] == sim_key:
+                    import pandas as pd
+                    report = simulation[1]
+                    durations = report.durations
+                    st.write(f"{tr.get('median_duration', 'Median duration')}: {durations['p50']:.1f} min · "
+                             f"{tr.get('p95_duration', '95th percentile')}: {durations['p95']:.1f} min")
+                    if durations["over_target"] is not None:
+                        over = f"{tr.get('over_duration', 'Respondents over the target duration')}: {durations['over_target']:.0%} ({params['duration']} min)"
+                        (st.warning if durations["over_target"] > 0.5 else st.write)(over)
+                    if report.unreachable:
+                        st.warning(f"{tr.get('unreachable_questions', 'Questions no respondent reaches')}:\n" + "\n".join(format_issues(report.unreachable, tr)))
+                    if report.low_sample:
+                        st.warning(f"{tr.get('low_sample_questions', 'Questions with too few expected answers for the target sample')}: "
+                                   + ", ".join(f"Q{i+1} ({report.reach[i] * target:.0f})" for i in report.low_sample))
+                    counts, edges = report.histogram
+                    st.bar_chart(pd.DataFrame({tr.get("respondents", "Respondents"): counts}, index=[f"{edge:.1f}" for edge in edges[:-1]]))
+                    st.dataframe(pd.DataFrame({"Question": [f"Q{i+1}" for i in range(len(report.reach))], tr.get("reach", "Reach"): report.reach}))
+                    st.write(f"{tr.get('distinct_paths', 'Distinct paths')}: {report.distinct_paths}")
+                    st.dataframe(pd.DataFrame(
+                        [(f"{share:.1%}", ", ".join(f"Q{i+1}" for i in shown) or "-") for share, shown in report.paths],
+                        columns=[tr.get("share", "Share"), tr.get("conditional_questions_asked", "Conditional questions asked")]))
+
+            # Déclinaison multilingue : le questionnaire affiché est traduit dans les autres langues en parallèle
+            with st.expander(tr.get("translations", "Translations"), expanded=False):
+                params = st.session_state.config_params
+                source_lang = params.get("survey_lang", "English")
+                other_languages = [lang for lang in LANGUAGES if lang != source_lang]
+                target_langs = st.multiselect(tr.get("target_languages", "Target languages"), other_languages, default=other_languages)
+                if st.button(tr.get("translate_button", "Translate")) and target_langs:
+                    # Lots soumis au moteur de génération, suivis à chaque relance comme les étapes 2 et 4
+                    run = submit_translation(survey.to_dict(), source_lang, target_langs, params["ai_service"], api_keys=st.session_state.api_keys,
+                                             use_cache=use_cache, fallback=fallback, engine=engine)
+                    st.session_state.translation_run = dict(run, hash=survey_hash(st.session_state.survey))
+                    st.session_state.jobs["translation"] = list(run["jobs"])
+                run = st.session_state.get("translation_run")
+                if run is not None:
+                    poll_jobs("translation", show_text=False)  # la clé disparaît une fois tous les lots terminés
+                if run is not None and "translation" not in st.session_state.jobs:
+                    del st.session_state.translation_run
+                    try:
+                        surveys = collect_translation(run, engine)
+                        st.session_state.translations = {"hash": run["hash"], "surveys": surveys}
+                        # Une ligne d'historique par questionnaire et par langue, mise à jour à chaque nouvelle traduction
+                        saved = st.session_state.setdefault("translation_ids", {})
+                        for lang in run["targets"]:
+                            key = (st.session_state.survey_id, lang)
+                            saved[key] = store.save_survey(dict(params, survey_lang=lang), st.session_state.survey_outline, surveys[lang], saved.get(key))
+                    except Exception as e:
+                        st.error(f"{tr.get('translation_error', 'Translation failed')}: {str(e)}")
+                translations = st.session_state.get("translations")
+                if translations and translations["hash"] == survey_hash(st.session_state.survey):
+                    import pandas as pd
+                    surveys = translations["surveys"]
+                    languages = list(surveys)
+                    st.dataframe(pd.DataFrame(iter_parallel_rows(surveys, "wide"), columns=parallel_header(languages, "wide", max_options(st.session_state.survey))))
+                    translation_format = st.selectbox(tr.get("export_label", "Export Format"), list(EXPORT_FORMATS), key="translation_format")
+                    file_name, mime = EXPORT_FORMATS[translation_format]
+                    st.download_button(
+                        label=tr.get("download", "Download"),
+                        data=export_translations(surveys, translation_format),
+                        file_name=file_name.replace("survey", "survey_translations"),
+                        mime=mime,
+                        key="download_translations"
+                    )
+
+# Rafraîchissement tant qu'une génération est en cours : l'utilisateur peut continuer à modifier les champs
+if any(engine.get(job_id) and not engine.get(job_id).finished for job_ids in st.session_state.jobs.values() for job_id in job_ids):
+    time.sleep(0.5)
+    st.experimental_rerun()
@@ -0,0 +1,109 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from ai_services import SERVICES
+from llm_router import get_router
+from survey_prompts import build_outline_prompt, build_survey_prompt
+from prompt_templates import prompt_stats
+from sectioned_generation import generate_survey_by_sections
+from survey_store import get_store
+
+# Génération de questionnaires sans interface : chaque ligne du fichier d'entrée contient
+# un config_params (mêmes clés que "Save Configuration" dans app.py).
+API_KEYS = {
+    "OpenAI (ChatGPT)": os.environ.get("OPENAI_API_KEY"),
+    "Claude (Anthropic)": os.environ.get("ANTHROPIC_API_KEY")
+}
+
+
+def read_configs(path):
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if line:
+                yield line_number, json.loads(line)
+
+def generate_one(index, params, service=None, use_cache=True, limits=None, by_sections=False, fallback=None, hedge_after=None):
+    service = service or params.get("ai_service") or SERVICES[0]
+    router = get_router()
+    record = {"index": index, "config": params, "service": service, "outline": None, "survey": None, "error": None}
+    start = time.perf_counter()
+    try:
+        # Un service inconnu n'interrompt pas le lot : la ligne est écrite avec son erreur
+        if service not in SERVICES:
+            raise ValueError(f"Unknown AI service: {service} (expected one of: {', '.join(SERVICES)})")
+        # Limite le nombre d'appels simultanés par service
+        limit = limits[service] if limits else threading.Semaphore()
+        with limit:
+            routed = router.generate(build_outline_prompt(params), service, api_keys=API_KEYS, use_cache=use_cache, fallback=fallback, hedge_after=hedge_after)
+            record["outline"] = routed.result
+        if by_sections:
+            # Chaque section prend son propre slot du service
+            record["survey"] = generate_survey_by_sections(params, record["outline"], service, use_cache=use_cache, limit=limit, api_keys=API_KEYS, fallback=fallback, hedge_after=hedge_after)
+        else:
+            with limit:
+                prompt = build_survey_prompt(params, record["outline"], structured=True)
+                record["prompt_tokens"] = prompt_stats(prompt)["tokens"]
+                routed = router.generate(prompt, service, api_keys=API_KEYS, structured=True, use_cache=use_cache, fallback=fallback, hedge_after=hedge_after)
+            record["survey"] = routed.result
+            record["served_by"] = routed.service
+    except Exception as e:
+        record["error"] = str(e)
+    record["elapsed"] = round(time.perf_counter() - start, 3)
+    return record
+
+def run_batch(input_path, output_path, workers=4, per_backend=None, service=None, use_cache=True, by_sections=False, fallback=None, hedge_after=None, store=None):
+    per_backend = per_backend or workers
+    limits = {name: threading.BoundedSemaphore(per_backend) for name in SERVICES}
+    done = failed = 0
+    out = sys.stdout if output_path == "-" else open(output_path, "w", encoding="utf-8")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(generate_one, line_number, params, service, use_cache, limits, by_sections, fallback, hedge_after)
+                for line_number, params in read_configs(input_path)
+            ]
+            # Les résultats sont écrits au fil de l'eau, dans l'ordre de fin d'exécution
+            for future in as_completed(futures):
+                record = future.result()
+                if store is not None and not record["error"]:
+                    # Enregistré dans l'historique : consultable et rechargeable depuis l'interface
+                    record["survey_id"] = store.save_survey(record["config"], record["outline"], record["survey"])
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                out.flush()
+                done += 1
+                if record["error"]:
+                    failed += 1
+                    print(f"[{record['index']}] {record['error']}", file=sys.stderr)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return done, failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate surveys (outline then full survey) from a JSONL file of configurations.")
+    parser.add_argument("input", help="JSONL file, one config_params object per line")
+    parser.add_argument("-o", "--output", default="-", help="JSONL output file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Maximum number of surveys generated concurrently")
+    parser.add_argument("--per-backend", type=int, default=None, help="Maximum concurrent requests per AI service (default: --workers)")
+    parser.add_argument("--service", choices=SERVICES, default=None, help="Override the ai_service of every record")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--sections", action="store_true", help="Generate the sections of each survey in parallel and merge them")
+    parser.add_argument("--no-fallback", action="store_true", help="Do not fall back to another configured service when one fails or stalls")
+    parser.add_argument("--store", action="store_true", help="Save generated surveys to the survey history (SURVEY_STORE_URL)")
+    parser.add_argument("--hedge-after", default=None, help="Seconds without a first token before sending a duplicate request to the next service, or 'auto'")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    done, failed = run_batch(args.input, args.output, args.workers, args.per_backend, args.service, not args.no_cache, args.sections,
+                             False if args.no_fallback else None, args.hedge_after, get_store() if args.store else None)
+    print(f"{done} surveys processed, {failed} failed in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stub_llm_server import StubLLMServer  # noqa: E402
+from synthetic import make_survey  # noqa: E402
+
+SURVEY_SIZES = [10, 100, 1000, 10000]
+
+
+def pytest_addoption(parser):
+    parser.addoption("--stub-latency", type=float, default=0.01, help="Stub LLM time to first token (seconds)")
+    parser.addoption("--stub-token-rate", type=float, default=2000.0, help="Stub LLM decode rate (tokens/second, 0 = unthrottled)")
+
+
+@pytest.fixture(scope="session")
+def stub_llm(request, tmp_path_factory):
+    # Les trois SDK pointent vers le serveur local ; le cache disque est isolé
+    os.environ["SURVEY_CACHE_PATH"] = str(tmp_path_factory.mktemp("cache") / "llm_responses.sqlite")
+    survey_text = json.dumps(make_survey(20), ensure_ascii=False)
+    server = StubLLMServer(
+        survey_text,
+        latency=request.config.getoption("--stub-latency"),
+        tokens_per_second=request.config.getoption("--stub-token-rate")
+    ).start()
+    import llm_clients
+    os.environ["OPENAI_BASE_URL"] = server.url + "/v1"
+    os.environ["ANTHROPIC_BASE_URL"] = server.url
+    previous_host = llm_clients.OLLAMA_HOST
+    llm_clients.OLLAMA_HOST = server.url
+    yield server
+    llm_clients.OLLAMA_HOST = previous_host
+    llm_clients.close_clients()
+    server.stop()
+
+
+@pytest.fixture(scope="session")
+def surveys():
+    return {size: make_survey(size) for size in SURVEY_SIZES}
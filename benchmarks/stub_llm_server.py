@@ -0,0 +1,184 @@
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Serveur local qui imite Ollama (/api/generate, /api/embed), OpenAI (/v1/chat/completions)
+# et Anthropic (/v1/messages), avec latence et débit de tokens configurables.
+CHUNK_CHARS = 4  # ~1 token
+EMBED_DIM = 256
+
+
+def _tokens(text):
+    return [text[i:i + CHUNK_CHARS] for i in range(0, len(text), CHUNK_CHARS)]
+
+
+def embedding(text):
+    # Sac de mots haché : des textes qui partagent leurs mots ont des vecteurs proches
+    vector = [0.0] * EMBED_DIM
+    for word in text.lower().split():
+        digest = hashlib.md5(word.strip("?.,!").encode("utf-8")).digest()
+        vector[digest[0] % EMBED_DIM] += 1.0 if digest[1] % 2 else -1.0
+    return vector
+
+
+class StubLLMServer:
+    def __init__(self, response_text, latency=0.01, tokens_per_second=2000.0):
+        self.response_text = response_text
+        self.latency = latency
+        self.backend_latency = {}  # latence supplémentaire par backend ("ollama", "openai", "anthropic")
+        self.tokens_per_second = tokens_per_second
+        self.requests = 0
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                stub.requests += 1
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.endswith("/api/generate"):
+                    time.sleep(stub.latency + stub.backend_latency.get("ollama", 0))
+                    self._ollama(body)
+                elif self.path.endswith("/api/embed"):
+                    inputs = body.get("input", [])
+                    self._send_json({"model": body.get("model"), "embeddings": [embedding(text) for text in ([inputs] if isinstance(inputs, str) else inputs)]})
+                elif self.path.endswith("/api/embeddings"):
+                    self._send_json({"embedding": embedding(body.get("prompt", ""))})
+                elif self.path.endswith("/chat/completions"):
+                    time.sleep(stub.latency + stub.backend_latency.get("openai", 0))
+                    self._openai(body)
+                elif self.path.endswith("/messages"):
+                    time.sleep(stub.latency + stub.backend_latency.get("anthropic", 0))
+                    self._anthropic(body)
+                else:
+                    self.send_error(404)
+
+            def _send_json(self, payload):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _start_stream(self, content_type):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+            def _emit(self, data):
+                self.wfile.write(data.encode("utf-8"))
+                self.wfile.flush()
+
+            def _response_text(self, prompt):
+                # Les demandes de traduction reçoivent les mêmes identifiants, textes préfixés ; le reste, le questionnaire fixe
+                marker = "Texts to translate:"
+                if marker in prompt:
+                    texts = json.loads(prompt.split(marker, 1)[1])
+                    return json.dumps({key: f"[tr] {value}" for key, value in texts.items()}, ensure_ascii=False)
+                return stub.response_text
+
+            def _decode(self, tokens):
+                # Simule le débit de décodage du modèle
+                delay = 1.0 / stub.tokens_per_second if stub.tokens_per_second else 0
+                for token in tokens:
+                    if delay:
+                        time.sleep(delay)
+                    yield token
+
+            def _ollama(self, body):
+                text = self._response_text(body.get("prompt", ""))
+                tokens = _tokens(text)
+                usage = {"prompt_eval_count": len(body.get("prompt", "")) // CHUNK_CHARS, "eval_count": len(tokens)}
+                if not body.get("stream", True):
+                    list(self._decode(tokens))
+                    self._send_json(dict({"model": body.get("model"), "response": text, "done": True}, **usage))
+                    return
+                self._start_stream("application/x-ndjson")
+                for token in self._decode(tokens):
+                    self._emit(json.dumps({"model": body.get("model"), "response": token, "done": False}) + "\n")
+                self._emit(json.dumps(dict({"model": body.get("model"), "response": "", "done": True}, **usage)) + "\n")
+
+            def _openai(self, body):
+                text = self._response_text("\n".join(m.get("content", "") for m in body.get("messages", [])))
+                tokens = _tokens(text)
+                prompt_tokens = sum(len(m.get("content", "")) for m in body.get("messages", [])) // CHUNK_CHARS
+                usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+                base = {"id": "chatcmpl-stub", "created": int(time.time()), "model": body.get("model")}
+                if not body.get("stream"):
+                    list(self._decode(tokens))
+                    self._send_json(dict(base, object="chat.completion", usage=usage, choices=[
+                        {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                    ]))
+                    return
+                self._start_stream("text/event-stream")
+                for token in self._decode(tokens):
+                    chunk = dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+                    self._emit(f"data: {json.dumps(chunk)}\n\n")
+                final = dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+                if body.get("stream_options", {}).get("include_usage"):
+                    self._emit(f"data: {json.dumps(final)}\n\n")
+                    final = dict(base, object="chat.completion.chunk", choices=[], usage=usage)
+                self._emit(f"data: {json.dumps(final)}\n\n")
+                self._emit("data: [DONE]\n\n")
+
+            def _anthropic(self, body):
+                text = self._response_text("\n".join(str(m.get("content", "")) for m in body.get("messages", [])))
+                tokens = _tokens(text)
+                tool = (body.get("tools") or [None])[0]
+                usage = {"input_tokens": len(json.dumps(body.get("messages", []))) // CHUNK_CHARS, "output_tokens": len(tokens)}
+                message = {"id": "msg_stub", "type": "message", "role": "assistant", "model": body.get("model"),
+                           "stop_reason": None, "stop_sequence": None}
+                if not body.get("stream"):
+                    list(self._decode(tokens))
+                    if tool:
+                        content = [{"type": "tool_use", "id": "toolu_stub", "name": tool["name"], "input": json.loads(text)}]
+                    else:
+                        content = [{"type": "text", "text": text}]
+                    self._send_json(dict(message, content=content, stop_reason="end_turn", usage=usage))
+                    return
+                self._start_stream("text/event-stream")
+
+                def event(name, payload):
+                    self._emit(f"event: {name}\ndata: {json.dumps(dict(payload, type=name))}\n\n")
+
+                event("message_start", {"message": dict(message, content=[], usage={"input_tokens": usage["input_tokens"], "output_tokens": 0})})
+                if tool:
+                    event("content_block_start", {"index": 0, "content_block": {"type": "tool_use", "id": "toolu_stub", "name": tool["name"], "input": {}}})
+                else:
+                    event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+                for token in self._decode(tokens):
+                    delta = {"type": "input_json_delta", "partial_json": token} if tool else {"type": "text_delta", "text": token}
+                    event("content_block_delta", {"index": 0, "delta": delta})
+                event("content_block_stop", {"index": 0})
+                event("message_delta", {"delta": {"stop_reason": "end_turn", "stop_sequence": None}, "usage": {"output_tokens": usage["output_tokens"]}})
+                event("message_stop", {})
+
+        return Handler
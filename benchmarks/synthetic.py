@@ -0,0 +1,25 @@
+import random
+
+# Questionnaires synthétiques pour les benchmarks (types, options et conditions variés)
+QUESTION_TYPES = ["Single-choice", "Multiple-choice", "Open-ended", "Scales (1-5)"]
+
+
+def make_survey(questions, seed=0):
+    rng = random.Random(seed)
+    items = []
+    for i in range(questions):
+        q_type = QUESTION_TYPES[i % len(QUESTION_TYPES)]
+        if q_type == "Open-ended":
+            options = None
+        elif q_type == "Scales (1-5)":
+            options = [str(v) for v in range(1, 6)]
+        else:
+            options = [f"Option {i}-{k}" for k in range(rng.randint(2, 6))]
+        condition = None
+        # Environ une question sur trois dépend d'une question à choix précédente
+        candidates = [j for j in range(max(0, i - 20), i) if items[j]["options"]]
+        if candidates and rng.random() < 0.33:
+            ref = rng.choice(candidates)
+            condition = f"If Q{ref + 1} = {rng.choice(items[ref]['options'])}"
+        items.append({"type": q_type, "text": f"Question {i + 1} about topic {rng.randint(1, 50)}?", "options": options, "condition": condition})
+    return {"intro": "Thank you for participating in this survey.", "questions": items, "outro": "Thank you!"}
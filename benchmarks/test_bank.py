@@ -0,0 +1,78 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+np = pytest.importorskip("numpy")
+
+from question_bank import LSHIndex, QuestionBank, find_duplicates, remove_duplicates  # noqa: E402
+from survey_validation import _validate  # noqa: E402
+
+BANK_SIZE = 50000
+DIM = 256
+QUERIES = 100
+PARAMS = {"survey_title": "Survey 1", "survey_context": "Customer satisfaction", "sector": "Retail", "survey_lang": "English",
+          "objectives": ["Question about topic 7", "Question about topic 21"]}
+
+
+@pytest.fixture(scope="module")
+def index():
+    # Vecteurs aléatoires unitaires ; chaque requête est une copie bruitée d'un vecteur de l'index
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((BANK_SIZE, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = LSHIndex(DIM)
+    index.add(list(range(BANK_SIZE)), vectors)
+    targets = rng.choice(BANK_SIZE, QUERIES, replace=False)
+    queries = vectors[targets] + 0.3 * rng.standard_normal((QUERIES, DIM)).astype(np.float32) / np.sqrt(DIM)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return index, targets, queries
+
+
+@pytest.fixture
+def bank(tmp_path, stub_llm):
+    bank = QuestionBank(str(tmp_path / "question_bank.sqlite"))
+    yield bank
+    bank.close()
+
+
+@pytest.mark.parametrize("exact", [False, True], ids=["lsh", "exact"])
+def test_bank_search(benchmark, index, exact):
+    index, targets, queries = index
+    results = benchmark(lambda: [index.search(query, 10, exact=exact) for query in queries])
+    recall = np.mean([result[0][0] == target for result, target in zip(results, targets)])
+    assert recall >= 0.95
+
+
+def test_find_duplicates(benchmark, bank, surveys):
+    # Les 20 dernières questions reprennent des questions antérieures (casse et espaces modifiés)
+    survey = surveys[1000]
+    copies = [dict(q, text="  " + q["text"].upper()) for q in survey["questions"][100:120]]
+    survey = dict(survey, questions=survey["questions"] + copies)
+    duplicates = benchmark(find_duplicates, survey, bank)
+    assert {i for i, _, _ in duplicates} >= set(range(1000, 1020))
+    # Le plongement du serveur de test (sac de mots) rapproche aussi certaines questions synthétiques
+    deduped = remove_duplicates(survey, [d for d in duplicates if d[0] >= 1000])
+    assert deduped.to_dict()["questions"] == surveys[1000]["questions"]
+    assert _validate(deduped) == _validate(surveys[1000])
+
+
+def test_bank_suggest(benchmark, bank, surveys):
+    # Questions des questionnaires précédents les plus proches des objectifs
+    assert bank.add_survey(surveys[1000], PARAMS) > 0
+    suggestions = benchmark(bank.suggest, PARAMS)
+    assert suggestions and all(q.language == "English" for q in suggestions)
+    assert bank.add_survey(surveys[1000], PARAMS) == 0  # déjà en banque : usage incrémenté
+
+
+def test_bank_embed_model_change(tmp_path, surveys):
+    # Un autre modèle d'embedding (autre dimension) sur la même base : les vecteurs ne sont pas mélangés
+    path = str(tmp_path / "question_bank.sqlite")
+    def embedder(dim):
+        def embed(texts):
+            return [np.random.default_rng(abs(hash(text)) % (1 << 32)).standard_normal(dim) for text in texts]
+        return embed
+    for model, dim in [("small", 64), ("large", 128)]:
+        bank = QuestionBank(path, embed=embedder(dim), model=model)
+        assert bank.add_survey(surveys[100], PARAMS) > 0
+        assert bank.search(surveys[100]["questions"][0]["text"], "English", k=1)[0].score > 0.99
+        assert bank.add_survey(surveys[100], PARAMS) == 0  # déjà en banque pour ce modèle
+        bank.close()
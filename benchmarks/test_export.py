@@ -0,0 +1,27 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from conftest import SURVEY_SIZES  # noqa: E402
+from survey_export import BATCH_FORMATS, EXPORT_FORMATS, LAYOUTS, export_batch, export_survey  # noqa: E402
+from synthetic import make_survey  # noqa: E402
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+@pytest.mark.parametrize("export_format", list(EXPORT_FORMATS))
+@pytest.mark.parametrize("size", SURVEY_SIZES)
+def test_export(benchmark, surveys, size, export_format, layout):
+    if export_format == "Excel":
+        pytest.importorskip("openpyxl")
+    assert benchmark(export_survey, surveys[size], export_format, layout)
+
+
+@pytest.mark.parametrize("export_format", list(BATCH_FORMATS))
+def test_export_batch(benchmark, export_format, tmp_path):
+    # 200 questionnaires de 50 questions produits à la volée
+    if export_format in ("Excel", "ZIP"):
+        pytest.importorskip("openpyxl")
+    def run():
+        with open(tmp_path / "batch", "wb") as fh:
+            export_batch(((f"survey {i}", make_survey(50, seed=i)) for i in range(200)), fh, export_format)
+    benchmark.pedantic(run, rounds=3)
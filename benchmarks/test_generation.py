@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from ai_services import SERVICES, call_ai_service, stream_ai_service  # noqa: E402
+from survey_prompts import build_outline_prompt, build_survey_prompt  # noqa: E402
+from prompt_templates import prompt_text  # noqa: E402
+from survey_schema import parse_survey  # noqa: E402
+
+PARAMS = {
+    "entity_name": "Acme Corp", "survey_title": "Satisfaction 2025", "ai_service": SERVICES[0],
+    "survey_context": "Customer satisfaction survey (e.g., NPS, CSAT)", "objectives": ["Measure Satisfaction"],
+    "sector": "Technology", "target_groups": ["Individuals"], "target_size": 100, "sections": 3,
+    "question_types": ["Single Choice", "Multiple Choice", "Open-ended"], "detail_level": "detailed",
+    "duration": 10, "survey_lang": "English", "tone": "neutral", "custom_instructions": "", "standards": ["ISO 20252", "AAPOR"]
+}
+OUTLINE = "Section 1: Satisfaction\n- How satisfied are you? (Open-ended)\n- Would you recommend? (Single-choice)\n- If yes, why? (Open-ended, conditional)"
+
+
+def test_build_prompts(benchmark):
+    benchmark(lambda: (build_outline_prompt(PARAMS), build_survey_prompt(PARAMS, OUTLINE, structured=True)))
+
+
+@pytest.mark.parametrize("service", SERVICES)
+def test_call_ai_service(benchmark, stub_llm, service):
+    # API historique sans flux, conservée comme référence face au flux routé (test_stream_time_to_first_token, test_routing)
+    prompt = build_survey_prompt(PARAMS, OUTLINE, structured=True)
+    survey = benchmark(lambda: parse_survey(call_ai_service(prompt, service, api_key="stub", use_cache=False)))
+    assert survey["questions"]
+
+
+@pytest.mark.parametrize("service", SERVICES)
+def test_stream_time_to_first_token(benchmark, stub_llm, service):
+    prompt = build_survey_prompt(PARAMS, OUTLINE, structured=True)
+    def first_token():
+        tokens = stream_ai_service(prompt, service, api_key="stub", use_cache=False, structured=True)
+        token = next(tokens)
+        tokens.close()
+        return token
+    assert benchmark(first_token)
+
+
+@pytest.mark.parametrize("service", SERVICES)
+def test_call_ai_service_cached(benchmark, stub_llm, service):
+    prompt = prompt_text(build_survey_prompt(PARAMS, OUTLINE, structured=True)) + f"\n{service}"
+    call_ai_service(prompt, service, api_key="stub")
+    requests = stub_llm.requests
+    benchmark(lambda: call_ai_service(prompt, service, api_key="stub"))
+    assert stub_llm.requests == requests
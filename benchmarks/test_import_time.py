@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Modules importés par app.py au démarrage (hors streamlit)
+APP_MODULES = ["ai_services", "survey_prompts", "llm_cache", "generation_engine", "metrics",
+               "sectioned_generation", "survey_validation", "survey_export", "question_bank", "survey_simulation"]
+# Dépendances lourdes qui ne doivent être chargées qu'à la première utilisation
+LAZY_MODULES = ["pandas", "openpyxl", "openai", "anthropic", "ollama", "httpx", "numpy", "http.server"]
+IMPORT_BUDGET = float(os.environ.get("IMPORT_TIME_BUDGET", "0.3"))  # secondes
+
+
+def _python(code, *flags):
+    return subprocess.run([sys.executable, *flags, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def test_heavy_dependencies_are_lazy():
+    code = f"import sys, json; import {', '.join(APP_MODULES)}; print(json.dumps([m for m in {LAZY_MODULES!r} if m in sys.modules]))"
+    assert json.loads(_python(code).stdout) == []
+
+
+def test_import_time(benchmark):
+    # -X importtime : temps cumulé des imports de premier niveau, sans le démarrage de l'interpréteur
+    def measure():
+        stderr = _python(f"import {', '.join(APP_MODULES)}", "-X", "importtime").stderr
+        total = 0
+        for line in stderr.splitlines():
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].rstrip() in (f" {m}" for m in APP_MODULES):
+                total += int(parts[1])
+        return total / 1e6
+    seconds = benchmark.pedantic(measure, rounds=5)
+    assert seconds < IMPORT_BUDGET
@@ -0,0 +1,61 @@
+import re
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import survey_validation  # noqa: E402
+from incremental_generation import plan_regeneration, splice_survey  # noqa: E402
+
+SECTIONS = 10
+
+
+def outline_for(survey):
+    # Une ligne de plan par question, réparties en sections égales
+    questions = survey["questions"]
+    per_section = len(questions) // SECTIONS
+    lines = []
+    for i, q in enumerate(questions):
+        if i % per_section == 0:
+            lines.append(f"Section {i // per_section + 1}: Topic")
+        q["section"] = i // per_section + 1
+        lines.append(f"- {q['text']} ({q['type']})")
+    return "\n".join(lines)
+
+
+@pytest.mark.parametrize("size", [100, 1000])
+def test_incremental_regeneration(benchmark, surveys, size):
+    # Une ligne modifiée à l'étape 3 : diff du plan, insertion d'une question et revalidation partielle
+    survey = {**surveys[size], "questions": [dict(q) for q in surveys[size]["questions"]]}
+    outline = outline_for(survey)
+    target = size // 2
+    edited = outline.replace(f"- {survey['questions'][target]['text']}", "- Edited question?", 1)
+    previous = survey_validation._validate(survey)
+    replacement = {"questions": [{"type": "Open-ended", "text": "Edited question?", "options": None, "condition": None}]}
+
+    def regenerate():
+        plan = plan_regeneration(outline, edited, survey)
+        results = {j: replacement for j, entry in enumerate(plan) if entry.regenerate}
+        spliced, changed = splice_survey(survey, outline, plan, results)
+        return spliced, changed, survey_validation.revalidate_survey(spliced, previous, changed)
+
+    spliced, changed, issues = benchmark(regenerate)
+    assert changed == [target]
+    assert issues == survey_validation._validate(spliced)
+
+
+def test_delete_section_keeps_other_sections(surveys):
+    # Supprimer la section 1 renumérote les en-têtes suivants sans rien régénérer ;
+    # une condition sur une question supprimée est retirée plutôt que de pointer vers une autre question
+    survey = {**surveys[100], "questions": [dict(q) for q in surveys[100]["questions"]]}
+    outline = outline_for(survey)
+    survey["questions"][15]["condition"] = f"If Q1 = {survey['questions'][0]['options'][0]}"
+    edited = re.sub(r"Section (\d+):", lambda m: f"Section {int(m.group(1)) - 1}:", outline[outline.index("Section 2:"):])
+    plan = plan_regeneration(outline, edited, survey)
+    assert [entry.old for entry in plan] == list(range(1, SECTIONS)) and not any(entry.regenerate for entry in plan)
+    spliced, changed = splice_survey(survey, outline, plan, {})
+    assert [q["text"] for q in spliced["questions"]] == [q["text"] for q in survey["questions"][10:]]
+    assert spliced["questions"][5]["condition"] is None
+    for old, new in zip(survey["questions"][10:], spliced["questions"]):
+        if new["condition"]:
+            assert int(new["condition"].split()[1][1:]) == int(old["condition"].split()[1][1:]) - 10
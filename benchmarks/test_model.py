@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from conftest import SURVEY_SIZES  # noqa: E402
+from survey_model import Survey  # noqa: E402
+from survey_validation import _validate, check_consistency  # noqa: E402
+
+
+@pytest.mark.parametrize("size", SURVEY_SIZES)
+def test_from_dict(benchmark, surveys, size):
+    # Normalisation unique à la réception : options internées, conditions analysées
+    survey = benchmark(Survey.from_dict, surveys[size])
+    assert survey.to_dict() == surveys[size]
+    assert _validate(survey) == _validate(surveys[size])
+
+
+@pytest.mark.parametrize("size", SURVEY_SIZES)
+def test_json_round_trip(benchmark, surveys, size):
+    survey = Survey.from_dict(surveys[size])
+    assert benchmark(lambda: Survey.from_json(survey.to_json())).to_dict() == surveys[size]
+
+
+@pytest.mark.parametrize("size", SURVEY_SIZES)
+def test_columns_round_trip(benchmark, surveys, size):
+    survey = Survey.from_dict(surveys[size])
+    columns = json.loads(json.dumps(survey.to_columns()))
+    assert benchmark(Survey.from_columns, columns).to_dict() == surveys[size]
+
+
+@pytest.mark.parametrize("size", SURVEY_SIZES)
+def test_check_consistency_model(benchmark, surveys, size):
+    # Relance Streamlit avec le questionnaire normalisé : l'empreinte est déjà calculée
+    survey = Survey.from_dict(surveys[size])
+    check_consistency(survey)
+    assert benchmark(check_consistency, survey) == check_consistency(surveys[size])
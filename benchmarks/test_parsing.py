@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from ollama_integration import extract_json  # noqa: E402
+from survey_schema import parse_survey, repair_json  # noqa: E402
+
+SIZES = [10, 100, 1000]
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_extract_json_fenced(benchmark, surveys, size):
+    response = "Here is your survey:\n```json\n" + json.dumps(surveys[size], ensure_ascii=False) + "\n```\nEnjoy!"
+    benchmark(extract_json, response)
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_parse_survey_raw(benchmark, surveys, size):
+    response = json.dumps(surveys[size], ensure_ascii=False)
+    assert len(benchmark(parse_survey, response)["questions"]) == size
+
+
+@pytest.mark.parametrize("size", SIZES)
+def test_repair_truncated(benchmark, surveys, size):
+    text = json.dumps(surveys[size], ensure_ascii=False)
+    truncated = text[:int(len(text) * 0.9)]
+    assert benchmark(repair_json, truncated)["questions"]
+
+
+@pytest.mark.parametrize("response", ["{", "{}", "{\"error\": \"model overloaded\"}", "{\"questions\": [{}]}"])
+def test_parse_survey_rejects_empty(response):
+    # Aucune question exploitable : échec, pour que le routeur passe au backend suivant
+    with pytest.raises(ValueError):
+        parse_survey(response)
+
+
+def test_repair_keeps_commas_in_strings():
+    # Seules les virgules finales structurelles sont retirées, pas celles du texte des questions ou options
+    text = '{"questions": [{"text": "Rank: a, b,]", "options": ["x,}", "y",],},], "intro": "Hi,}"'
+    assert repair_json(text) == {"questions": [{"text": "Rank: a, b,]", "options": ["x,}", "y"]}], "intro": "Hi,}"}
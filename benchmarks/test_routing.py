@@ -0,0 +1,101 @@
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from ai_services import SERVICES  # noqa: E402
+from llm_router import RouteError, Router  # noqa: E402
+from prompt_templates import prompt_text  # noqa: E402
+from survey_prompts import build_survey_prompt  # noqa: E402
+from test_generation import OUTLINE, PARAMS  # noqa: E402
+
+API_KEYS = {service: "stub" for service in SERVICES[1:]}
+
+
+@pytest.fixture
+def slow_ollama(stub_llm):
+    # Simule la contention GPU : Ollama met 1 s avant son premier token
+    stub_llm.backend_latency["ollama"] = 1.0
+    yield stub_llm
+    stub_llm.backend_latency.clear()
+
+
+def test_route_direct(benchmark, stub_llm):
+    router = Router()
+    prompt = build_survey_prompt(PARAMS, OUTLINE, structured=True)
+    routed = benchmark(lambda: router.generate(prompt, SERVICES[0], structured=True, use_cache=False, fallback=False))
+    assert routed.service == SERVICES[0] and routed.result["questions"]
+
+
+def test_hedged_request(benchmark, slow_ollama):
+    router = Router()
+    prompt = build_survey_prompt(PARAMS, OUTLINE, structured=True)
+    router.generate(prompt, SERVICES[1], api_keys=API_KEYS, structured=True, use_cache=False, fallback=False)  # clients déjà créés
+    def hedged():
+        start = time.perf_counter()
+        routed = router.generate(prompt, SERVICES[0], api_keys=API_KEYS, structured=True, use_cache=False, hedge_after=0.05)
+        return routed, time.perf_counter() - start
+    routed, elapsed = benchmark.pedantic(hedged, rounds=5)
+    assert routed.service != SERVICES[0] and routed.result["questions"]
+    assert elapsed < 1.0
+
+
+def test_fallback_on_stall(benchmark, slow_ollama):
+    router = Router()
+    prompt = build_survey_prompt(PARAMS, OUTLINE, structured=True)
+    routed = benchmark.pedantic(
+        lambda: router.generate(prompt, SERVICES[0], api_keys=API_KEYS, structured=True, use_cache=False, timeout=0.1),
+        rounds=5
+    )
+    assert routed.service != SERVICES[0]
+    assert router.health[SERVICES[0]].error_rate() > 0
+
+
+def test_no_stall_timeout_on_last_backend(slow_ollama):
+    # Sans autre backend à essayer, un Ollama lent (chargement du modèle) va jusqu'au bout
+    router = Router()
+    prompt = build_survey_prompt(PARAMS, OUTLINE, structured=True)
+    routed = router.generate(prompt, SERVICES[0], structured=True, use_cache=False, fallback=False, timeout=0.1)
+    assert routed.service == SERVICES[0] and routed.result["questions"]
+
+
+def test_rejected_response_not_cached(stub_llm):
+    # Une réponse refusée par la vérification ne doit pas être resservie par le cache aux tentatives suivantes
+    router = Router()
+    prompt = prompt_text(build_survey_prompt(PARAMS, OUTLINE, structured=True)) + f"\n{uuid.uuid4()}"
+    def reject(text):
+        raise ValueError("rejected")
+    for _ in range(2):
+        requests = stub_llm.requests
+        with pytest.raises(RouteError):
+            router.generate(prompt, SERVICES[0], structured=True, fallback=False, validate=reject)
+        assert stub_llm.requests == requests + 1
+    routed = router.generate(prompt, SERVICES[0], structured=True, fallback=False)
+    requests = stub_llm.requests
+    assert router.generate(prompt, SERVICES[0], structured=True, fallback=False).result == routed.result
+    assert stub_llm.requests == requests  # réponse valide : servie par le cache
+
+
+def test_missing_key_keeps_circuit_closed(stub_llm):
+    # Une session sans clé ne doit pas mettre le backend à l'écart pour les autres sessions
+    router = Router()
+    prompt = build_survey_prompt(PARAMS, OUTLINE, structured=True)
+    for _ in range(5):
+        with pytest.raises(RouteError):
+            router.generate(prompt, SERVICES[1], structured=True, use_cache=False, fallback=False)
+    assert router.health[SERVICES[1]].available and router.health[SERVICES[1]].error_rate() == 0
+    assert router.route(SERVICES[1], {SERVICES[1]: "stub"})[0] == SERVICES[1]
+
+
+def test_attempts_share_backend_slots(slow_ollama):
+    # Toute tentative sur Ollama (service choisi, repli ou requête doublée, quelle que soit la file) prend un de ses slots
+    router = Router(limits={SERVICES[0]: 1})
+    prompt = build_survey_prompt(PARAMS, OUTLINE, structured=True)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(lambda _: router.generate(prompt, SERVICES[0], structured=True, use_cache=False, fallback=False), range(3)))
+    assert all(routed.result["questions"] for routed in results)
+    assert time.perf_counter() - start >= 3 * slow_ollama.backend_latency["ollama"]
@@ -0,0 +1,47 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+pytest.importorskip("numpy")
+
+from survey_model import Survey  # noqa: E402
+from survey_simulation import compile_skip_logic, simulate_survey  # noqa: E402
+from survey_validation import _validate  # noqa: E402
+
+BLOCKING = {"out_of_bounds", "forward_reference", "no_options_ref", "invalid_condition_value"}
+
+
+@pytest.mark.parametrize("size,respondents", [(10, 1000000), (1000, 100000), (10000, 10000)])
+def test_simulate_survey(benchmark, surveys, size, respondents):
+    survey = Survey.from_dict(surveys[size])
+    report = benchmark(simulate_survey, survey, respondents, duration=10, distribution="varied", skip_rate=0.05, seed=0)
+    assert len(report.reach) == size and not report.unreachable
+    assert 0 < sum(share for share, _ in report.paths) <= 1 + 1e-9
+    assert report.durations["p5"] <= report.durations["p50"] <= report.durations["p95"]
+    assert sum(report.histogram[0]) == respondents
+
+
+def test_simulation_reach(surveys):
+    # Options tirées uniformément : part attendue 1 / nombre d'options (choix unique) ou multi_rate (choix multiple)
+    survey = Survey.from_dict(surveys[100])
+    report = simulate_survey(survey, 200000, seed=1)
+    compiled, _ = compile_skip_logic(survey)
+    for i, q in enumerate(compiled):
+        if q.condition is not None:
+            j = q.condition[0]
+            expected = report.reach[j] * (0.3 if compiled[j].kind == "multiple" else 1 / compiled[j].options)
+            assert report.reach[i] == pytest.approx(expected, abs=0.01)
+
+
+def test_unreachable_questions(surveys):
+    # Conditions invalides ou en avant : mêmes questions que la validation, et celles qui en dépendent
+    questions = [dict(q) for q in surveys[100]["questions"]]
+    questions[8] = dict(questions[8], options=["A", "B"], condition="If Q50 = A")
+    questions[20]["condition"] = "If Q1 = missing"
+    questions[30] = dict(questions[30], options=["A", "B"], type="Single-choice", condition="If Q9 = A")
+    questions[40]["condition"] = "If Q31 = A"
+    survey = Survey.from_dict(dict(surveys[100], questions=questions))
+    report = simulate_survey(survey, 1000, seed=0)
+    invalid = {issue.prefix for issue in _validate(survey) if issue.key in BLOCKING}
+    unreachable = {issue.prefix for issue in report.unreachable}
+    assert invalid <= unreachable and unreachable - invalid == {"Q31", "Q41"}
+    assert all(report.reach[int(prefix[1:]) - 1] == 0 for prefix in unreachable)
@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from survey_store import open_store  # noqa: E402
+
+ROWS = 5000
+LANGUAGES = ["Français", "English", "Español", "العربية"]
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory, surveys):
+    store = open_store("sqlite:///" + str(tmp_path_factory.mktemp("store") / "surveys.sqlite"))
+    for i in range(ROWS):
+        config = {"entity_name": f"Entity {i % 50}", "survey_title": f"Survey {i}", "survey_lang": LANGUAGES[i % 4], "survey_context": f"Type {i % 5}"}
+        store.save_survey(config, f"Section 1: Topic {i}", surveys[10])
+    yield store
+    store.close()
+
+
+def test_list_first_page(benchmark, store):
+    page, cursor = benchmark(store.list_surveys, language="English")
+    assert len(page) == 20 and cursor is not None
+
+
+def test_list_deep_page(benchmark, store):
+    # Curseur au milieu de l'historique : même coût que la première page
+    page, cursor = store.list_surveys(language="English", limit=ROWS // 8)
+    deep, _ = benchmark(store.list_surveys, language="English", before=cursor)
+    assert deep and deep[0].created_at <= page[-1].created_at
+
+
+def test_reload_survey(benchmark, store):
+    page, _ = store.list_surveys(entity="Entity 7")
+    record = benchmark(store.get_survey, page[0].id)
+    assert record["survey"]["questions"]
+
+
+def test_find_existing(benchmark, store):
+    config = {"entity_name": "Entity 12", "survey_title": "Survey 1962", "survey_lang": LANGUAGES[1962 % 4], "survey_context": "Type 2"}
+    assert benchmark(store.find_existing, config, "Section 1: Topic 1962") is not None
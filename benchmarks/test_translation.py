@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from ai_services import SERVICES  # noqa: E402
+from survey_prompts import LANGUAGES  # noqa: E402
+from survey_translation import translate_survey  # noqa: E402
+from survey_validation import _validate  # noqa: E402
+
+SOURCE = "English"
+API_KEYS = {service: "stub" for service in SERVICES[1:]}
+
+
+@pytest.mark.parametrize("service", SERVICES)
+def test_translate_all_languages(benchmark, stub_llm, surveys, service):
+    # Les trois langues cibles et leurs lots partagent les slots du service
+    survey = surveys[100]
+    results = benchmark.pedantic(
+        lambda: translate_survey(survey, SOURCE, service=service, api_keys=API_KEYS, use_cache=False),
+        rounds=3
+    )
+    assert list(results) == [SOURCE] + [lang for lang in LANGUAGES if lang != SOURCE]
+    for lang, translated in results.items():
+        assert len(translated["questions"]) == len(survey["questions"])
+        assert _validate(translated) == _validate(survey)
+
+
+def test_translate_cached(benchmark, stub_llm, surveys):
+    # Deuxième passe : chaque texte est servi par le cache, aucune requête au modèle
+    survey = surveys[100]
+    translate_survey(survey, SOURCE, service=SERVICES[0])
+    requests = stub_llm.requests
+    benchmark(translate_survey, survey, SOURCE, service=SERVICES[0])
+    assert stub_llm.requests == requests
@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+import survey_validation  # noqa: E402
+from conftest import SURVEY_SIZES  # noqa: E402
+
+
+@pytest.mark.parametrize("size", SURVEY_SIZES)
+def test_validate_cold(benchmark, surveys, size):
+    # Sans mémoïsation : coût réel de l'indexation et des vérifications
+    benchmark(survey_validation._validate, surveys[size])
+
+
+@pytest.mark.parametrize("size", SURVEY_SIZES)
+def test_check_consistency_memoized(benchmark, surveys, size):
+    # Cas d'une relance Streamlit : empreinte du contenu puis lecture du résultat mémorisé
+    survey_validation.check_consistency(surveys[size])
+    benchmark(survey_validation.check_consistency, surveys[size])
@@ -0,0 +1,157 @@
+import asyncio
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+
+from ai_services import BACKEND_NAMES, SERVICES
+from llm_router import BACKEND_LIMITS, get_router
+from metrics import increment, observe
+
+JOB_TTL = 3600  # Les tâches terminées sont conservées une heure pour être consultées
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class Job:
+    def __init__(self, job_id, kind, prompt, service, api_key=None, use_cache=True, api_keys=None, fallback=None, validate=None):
+        self.id = job_id
+        self.kind = kind  # "text" (plan des questions), "survey" (JSON complet) ou "translation" (lot de textes)
+        self.prompt = prompt
+        self.service = service
+        self.api_keys = dict(api_keys or {})
+        if api_key:
+            self.api_keys[service] = api_key
+        self.use_cache = use_cache
+        self.fallback = fallback
+        self.validate = validate  # vérification propre à la tâche (ex. identifiants d'un lot de traduction)
+        self.served_by = None  # service qui a effectivement répondu (repli ou requête doublée)
+        self.status = QUEUED
+        self.text = ""  # texte partiel, mis à jour au fil du flux
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel = threading.Event()
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED, CANCELLED)
+
+
+class GenerationEngine:
+    def __init__(self, limits=None):
+        self.limits = dict(BACKEND_LIMITS, **(limits or {}))
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        # La boucle asyncio tourne dans un thread dédié : le script Streamlit n'attend jamais la génération
+        self._loop = asyncio.new_event_loop()
+        self._executor = ThreadPoolExecutor(max_workers=sum(max(1, n) for n in self.limits.values()), thread_name_prefix="generation")
+        self._ready = threading.Event()
+        threading.Thread(target=self._run_loop, name="generation-engine", daemon=True).start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        # Une file par service, consommée par autant de workers que de slots autorisés
+        self._queues = {service: asyncio.Queue() for service in SERVICES}
+        for service, queue in self._queues.items():
+            for _ in range(max(1, self.limits.get(service, 1))):
+                self._loop.create_task(self._worker(queue))
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _worker(self, queue):
+        while True:
+            job = await queue.get()
+            try:
+                if job.status == QUEUED:
+                    job.status = RUNNING
+                    await self._loop.run_in_executor(self._executor, self._execute, job)
+            finally:
+                queue.task_done()
+
+    def _execute(self, job):
+        # Une seule génération : le questionnaire est demandé en sortie structurée
+        # et une réponse tronquée est réparée par parse_survey au lieu d'être régénérée.
+        # Le routeur peut se replier sur un autre service ou doubler la requête si le premier token tarde.
+        structured = job.kind == "survey"
+        job.started_at = time.time()
+        observe("survey_stage_seconds", time.time() - job.created_at, stage="queue_wait", backend=BACKEND_NAMES[job.service])
+        def on_token(service, text):
+            job.served_by, job.text = service, text
+        try:
+            routed = get_router().generate(job.prompt, job.service, api_keys=job.api_keys, structured=structured, use_cache=job.use_cache,
+                                           fallback=job.fallback, on_token=on_token, cancel=job._cancel, validate=job.validate)
+            if routed is not None and not job._cancel.is_set():
+                job.served_by, job.text, job.result = routed
+                job.status = DONE
+        except ValueError as e:
+            job.error = f"JSON parsing error: {str(e)}"
+        except Exception as e:
+            job.error = f"Error generating: {str(e)}"
+        if job._cancel.is_set():
+            job.status = CANCELLED
+        elif job.status != DONE:
+            job.status = FAILED
+            increment("survey_generation_failures_total", backend=BACKEND_NAMES[job.service], reason="job")
+        job.finished_at = time.time()
+        job._done.set()
+
+    def submit(self, prompt, service, kind="text", api_key=None, use_cache=True, api_keys=None, fallback=None, validate=None):
+        if service not in self._queues:
+            raise ValueError(f"Unknown AI service: {service}")
+        with self._lock:
+            self._prune()
+            job = Job(f"job-{next(self._ids)}", kind, prompt, service, api_key, use_cache, api_keys, fallback, validate)
+            self._jobs[job.id] = job
+        # La tâche attend dans la file du premier service de sa route : un backend en panne n'accumule pas de retard
+        route = get_router().route(service, job.api_keys, fallback)
+        self._loop.call_soon_threadsafe(self._queues[route[0]].put_nowait, job)
+        return job.id
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        job._cancel.set()
+        if job.status == QUEUED:
+            # Le worker ignorera la tâche lorsqu'elle sortira de la file
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            job._done.set()
+        return True
+
+    def wait(self, job_id, timeout=None):
+        # Attente bloquante (lots en ligne de commande, benchmarks) ; l'interface interroge get() à chaque relance
+        job = self.get(job_id)
+        if job is not None:
+            job._done.wait(timeout)
+        return job
+
+    def queue_sizes(self):
+        return {service: queue.qsize() for service, queue in self._queues.items()}
+
+    def _prune(self):
+        now = time.time()
+        for job_id in [j.id for j in self._jobs.values() if j.finished and now - j.finished_at > JOB_TTL]:
+            del self._jobs[job_id]
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    # Moteur unique pour tout le processus, partagé par les sessions Streamlit
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = GenerationEngine()
+        return _engine
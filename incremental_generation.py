@@ -0,0 +1,166 @@
+import difflib
+import re
+from collections import namedtuple
+
+from sectioned_generation import QUESTION_REF, SECTION_HEADER, _shift_condition, split_outline_sections
+from survey_prompts import build_question_prompt, build_section_prompt
+
+# Régénération incrémentale après les modifications de l'étape 3 : le plan modifié est comparé
+# à celui du dernier questionnaire généré, et seules les sections ou questions changées sont redemandées.
+QUESTION_LINE = re.compile(r'^\s*(?:[-*•]|\d+[.)])\s+')
+
+# old : index de la section d'origine (None pour une section ajoutée)
+# regenerate : None (section conservée), "section" (section entière) ou positions locales des questions à refaire
+SectionPlan = namedtuple("SectionPlan", ["old", "regenerate"])
+
+
+def _normalize(text):
+    return " ".join(text.split()).lower()
+
+def _section_key(section):
+    # Le numéro de l'en-tête change dès qu'une section est ajoutée ou supprimée avant celle-ci : il est ignoré
+    match = SECTION_HEADER.search(section)
+    if match:
+        section = section[:match.start()] + re.sub(r"\d+", "", match.group(0), count=1) + section[match.end():]
+    return _normalize(section)
+
+def question_lines(section):
+    return [line.strip() for line in section.splitlines() if QUESTION_LINE.match(line)]
+
+def group_questions(survey, outline):
+    # Questions du questionnaire regroupées par section du plan ; None si la correspondance est impossible
+    sections = split_outline_sections(outline)
+    questions = survey.get("questions") or []
+    if not sections or not questions:
+        return None
+    if len(sections) == 1:
+        return [list(range(len(questions)))]
+    if all(isinstance(q, dict) and isinstance(q.get("section"), int) for q in questions):
+        groups = [[] for _ in sections]
+        for i, q in enumerate(questions):
+            if not 1 <= q["section"] <= len(sections):
+                return None
+            groups[q["section"] - 1].append(i)
+        return groups
+    # Questionnaire généré d'un seul bloc : rattachement possible si chaque ligne du plan a donné une question
+    counts = [len(question_lines(section)) for section in sections]
+    if sum(counts) != len(questions):
+        return None
+    groups, start = [], 0
+    for count in counts:
+        groups.append(list(range(start, start + count)))
+        start += count
+    return groups
+
+def plan_regeneration(old_outline, new_outline, survey):
+    # Diff des sections (difflib), puis des lignes de questions à l'intérieur des sections modifiées
+    groups = group_questions(survey, old_outline)
+    if groups is None:
+        return None
+    old_sections = split_outline_sections(old_outline)
+    new_sections = split_outline_sections(new_outline)
+    matcher = difflib.SequenceMatcher(None, [_section_key(s) for s in old_sections], [_section_key(s) for s in new_sections], autojunk=False)
+    plan = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        for k in range(j2 - j1):
+            old = i1 + k if tag in ("equal", "replace") and i1 + k < i2 else None
+            if tag == "equal":
+                plan.append(SectionPlan(old, None))
+                continue
+            if old is None:
+                plan.append(SectionPlan(None, "section"))
+                continue
+            old_lines = [_normalize(line) for line in question_lines(old_sections[old])]
+            new_lines = [_normalize(line) for line in question_lines(new_sections[j1 + k])]
+            # Une ligne du plan par question : seules les lignes modifiées sont régénérées
+            if len(old_lines) == len(new_lines) == len(groups[old]):
+                changed = [n for n, (a, b) in enumerate(zip(old_lines, new_lines)) if a != b]
+                plan.append(SectionPlan(old, changed or None))
+            else:
+                plan.append(SectionPlan(old, "section"))
+    return plan
+
+def build_regeneration_prompts(params, outline, plan, structured=True):
+    # Renvoie [(index de section, prompt)] pour les seules parties à régénérer
+    sections = split_outline_sections(outline)
+    prompts = []
+    for j, entry in enumerate(plan):
+        if entry.regenerate == "section":
+            prompts.append((j, build_section_prompt(params, sections[j], j + 1, len(sections), structured=structured)))
+        elif entry.regenerate:
+            lines = question_lines(sections[j])
+            prompts.append((j, build_question_prompt(params, sections[j], [lines[n] for n in entry.regenerate], j + 1, len(sections), structured=structured)))
+    return prompts
+
+def remap_condition(condition, mapping):
+    # Renumérote les questions référencées ; None si l'une d'elles a été supprimée
+    # (un Qn périmé désignerait une autre question après renumérotation)
+    missing = []
+    def replace(match):
+        old = int(match.group(1)) - 1
+        if old not in mapping:
+            missing.append(old)
+            return match.group(0)
+        return f"Q{mapping[old] + 1}"
+    if isinstance(condition, str):
+        condition = QUESTION_REF.sub(replace, condition)
+    elif isinstance(condition, dict) and "question" in condition:
+        condition = dict(condition)
+        condition["question"] = QUESTION_REF.sub(replace, str(condition["question"]))
+    return None if missing else condition
+
+def splice_survey(survey, old_outline, plan, results):
+    # Insère les parties régénérées (results : index de section -> questionnaire partiel) dans le questionnaire
+    # existant ; renvoie le nouveau questionnaire et les indices de questions modifiées ou déplacées.
+    groups = group_questions(survey, old_outline)
+    old_questions = survey.get("questions") or []
+    questions, origins, offsets = [], [], []
+    for j, entry in enumerate(plan):
+        offsets.append(len(questions))
+        old_group = groups[entry.old] if entry.old is not None else []
+        if entry.regenerate == "section":
+            new_part = results[j].get("questions", [])
+            parts = [(None, k, q) for k, q in enumerate(new_part)]
+        else:
+            replaced = {}
+            if entry.regenerate:
+                new_part = results[j].get("questions", [])
+                if len(new_part) != len(entry.regenerate):
+                    raise ValueError(f"Section {j + 1}: expected {len(entry.regenerate)} regenerated question(s), got {len(new_part)}.")
+                replaced = dict(zip(entry.regenerate, new_part))
+            parts = [(None, k, replaced[k]) if k in replaced else (old_idx, k, old_questions[old_idx]) for k, old_idx in enumerate(old_group)]
+        for old_idx, k, q in parts:
+            questions.append(dict(q, section=j + 1))
+            origins.append((j, old_idx, k))
+
+    # Correspondance ancienne position -> nouvelle, y compris pour les questions refaites à la même place
+    mapping = {}
+    for new_idx, (j, old_idx, k) in enumerate(origins):
+        entry = plan[j]
+        if old_idx is not None:
+            mapping[old_idx] = new_idx
+        elif entry.old is not None and k < len(groups[entry.old]):
+            mapping[groups[entry.old][k]] = new_idx
+
+    changed = []
+    for new_idx, (j, old_idx, k) in enumerate(origins):
+        q = questions[new_idx]
+        if old_idx is None:
+            # Conditions numérotées localement par le modèle, comme pour la génération par sections
+            if q.get("condition"):
+                q["condition"] = _shift_condition(q["condition"], offsets[j])
+            changed.append(new_idx)
+        elif q.get("condition"):
+            q["condition"] = remap_condition(q["condition"], mapping)
+            if q["condition"] != old_questions[old_idx].get("condition") or old_idx != new_idx:
+                changed.append(new_idx)
+        elif old_idx != new_idx:
+            changed.append(new_idx)
+
+    spliced = {"intro": survey.get("intro", ""), "questions": questions, "outro": survey.get("outro", "")}
+    for j in sorted(results):
+        if not spliced["intro"] and results[j].get("intro"):
+            spliced["intro"] = results[j]["intro"]
+        if not spliced["outro"] and results[j].get("outro"):
+            spliced["outro"] = results[j]["outro"]
+    return spliced, changed
@@ -0,0 +1,194 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# Cache des réponses des modèles, adressé par le contenu de la requête
+CACHE_PATH = os.environ.get("SURVEY_CACHE_PATH", os.path.join(".cache", "llm_responses.sqlite"))
+CACHE_MAX_ENTRIES = int(os.environ.get("SURVEY_CACHE_MAX_ENTRIES", "2000"))
+CACHE_MAX_BYTES = int(float(os.environ.get("SURVEY_CACHE_MAX_MB", "100")) * 1024 * 1024)
+CACHE_TTL = float(os.environ.get("SURVEY_CACHE_TTL_HOURS", "168")) * 3600
+BULK_CHUNK = 500  # clés par requête IN (limite de variables SQLite)
+
+
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES, ttl=CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Une seule connexion partagée entre les sessions Streamlit, protégée par un verrou
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, backend TEXT, model TEXT, response TEXT, "
+            "size INTEGER, created_at REAL, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(backend, model, prompt, params=None):
+        payload = json.dumps([backend, model, prompt, params or {}], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, key, response, backend="", model=""):
+        now = time.time()
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, backend, model, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, backend, model, response, size, now, now)
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def delete(self, key):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def get_many(self, keys):
+        # Lecture groupée (ex. traductions texte par texte) : une requête et un seul commit
+        now = time.time()
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), BULK_CHUNK):
+                chunk = keys[start:start + BULK_CHUNK]
+                rows = self._conn.execute(
+                    f"SELECT key, response, created_at FROM responses WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                found.update((key, response) for key, response, created_at in rows if now - created_at <= self.ttl)
+            if found:
+                self._conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?", [(now, key) for key in found])
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items, backend="", model=""):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO responses (key, backend, model, response, size, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(key, backend, model, response, len(response.encode("utf-8")), now, now) for key, response in items.items()]
+            )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now):
+        # Expiration (TTL) puis éviction LRU jusqu'à respecter les limites de taille
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            count -= 1
+            total -= size
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": count,
+            "bytes": total
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    # Instance unique pour tout le processus
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache()
+        return _cache
+
+def cached_call(backend, model, prompt, params, generate, use_cache=True):
+    if not use_cache:
+        return generate()
+    cache = get_cache()
+    key = cache.make_key(backend, model, prompt, params)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+    response = generate()
+    if response:
+        cache.set(key, response, backend, model)
+    return response
+
+def cached_stream(backend, model, prompt, params, stream, use_cache=True, complete=None, validate=None):
+    # En cas de succès, le texte mis en cache est renvoyé d'un seul bloc.
+    # Une réponse interrompue n'est conservée que si `complete(text)` la juge exploitable.
+    # validate(text) lève une exception pour une réponse inutilisable : elle n'est pas mise en cache,
+    # et une entrée déjà en cache qui échoue (enregistrée avant la vérification) est supprimée.
+    if not use_cache:
+        yield from stream()
+        return
+    cache = get_cache()
+    key = cache.make_key(backend, model, prompt, params)
+    cached = cache.get(key)
+    if cached is not None:
+        if _valid(validate, cached):
+            yield cached
+            return
+        cache.delete(key)
+    text = ""
+    try:
+        for token in stream():
+            text += token
+            yield token
+    except GeneratorExit:
+        if text and complete and complete(text) and _valid(validate, text):
+            cache.set(key, text, backend, model)
+        raise
+    if text:
+        if validate:
+            validate(text)
+        cache.set(key, text, backend, model)
+
+def _valid(validate, text):
+    try:
+        if validate:
+            validate(text)
+        return True
+    except Exception:
+        return False
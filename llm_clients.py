@@ -0,0 +1,72 @@
+import importlib
+import os
+import threading
+
+# Registre des clients LLM partagé par tout le processus (et donc par toutes les sessions Streamlit).
+# Chaque client garde son pool de connexions HTTP (keep-alive, sessions TLS) d'un appel à l'autre.
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "300"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "10"))
+LLM_MAX_CONNECTIONS = int(os.environ.get("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE = int(os.environ.get("LLM_MAX_KEEPALIVE", "10"))
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _http_options(timeout=None, max_connections=None, httpx=None):
+    if httpx is None:
+        import httpx
+    return {
+        "timeout": httpx.Timeout(timeout or LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        "limits": httpx.Limits(
+            max_connections=max_connections or LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=min(LLM_MAX_KEEPALIVE, max_connections or LLM_MAX_CONNECTIONS)
+        )
+    }
+
+def _sdk_http_client(sdk, timeout=None, max_connections=None):
+    # Les SDK exigent un client du module httpx qu'ils embarquent (httpx ou httpx2 selon la version)
+    base = next(cls for cls in sdk.DefaultHttpxClient.__mro__ if cls.__name__ == "Client")
+    httpx = importlib.import_module(base.__module__.split(".")[0])
+    return sdk.DefaultHttpxClient(**_http_options(timeout, max_connections, httpx))
+
+def _get_or_create(key, factory):
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = factory()
+            _clients[key] = client
+        return client
+
+def get_ollama_client(host=None, timeout=None, max_connections=None):
+    host = host or OLLAMA_HOST
+    def factory():
+        from ollama import Client
+        return Client(host=host, **_http_options(timeout, max_connections))
+    return _get_or_create(("ollama", host, timeout, max_connections), factory)
+
+def get_openai_client(api_key, timeout=None, max_connections=None):
+    if not api_key:
+        return None
+    def factory():
+        import openai
+        return openai.OpenAI(api_key=api_key, http_client=_sdk_http_client(openai, timeout, max_connections))
+    return _get_or_create(("openai", api_key, timeout, max_connections), factory)
+
+def get_anthropic_client(api_key, timeout=None, max_connections=None):
+    if not api_key:
+        return None
+    def factory():
+        import anthropic
+        return anthropic.Anthropic(api_key=api_key, http_client=_sdk_http_client(anthropic, timeout, max_connections))
+    return _get_or_create(("anthropic", api_key, timeout, max_connections), factory)
+
+def close_clients():
+    with _lock:
+        for client in _clients.values():
+            # Les clients OpenAI/Anthropic exposent close(), le client Ollama son httpx.Client interne
+            closer = getattr(client, "close", None) or getattr(getattr(client, "_client", None), "close", None)
+            if closer:
+                closer()
+        _clients.clear()
@@ -0,0 +1,266 @@
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import os
+import queue
+import threading
+import time
+
+from ai_services import BACKEND_NAMES, SERVICES, is_configuration_error, stream_ai_service
+from ollama_integration import strip_think
+from survey_schema import parse_survey
+from metrics import increment, observe
+
+# Routage entre backends : repli sur un autre service en cas d'échec ou de blocage,
+# requêtes doublées (hedging) si le premier token tarde, choix des routes selon la santé observée.
+ROUTE_FALLBACK = os.environ.get("SURVEY_ROUTE_FALLBACK", "1") != "0"
+ROUTE_TIMEOUT = float(os.environ.get("SURVEY_ROUTE_TIMEOUT", "60"))  # secondes sans nouveau token avant de passer au backend suivant
+HEDGE_AFTER = os.environ.get("SURVEY_HEDGE_AFTER", "")  # secondes avant le premier token, "auto" (p95 observé) ou vide (désactivé)
+MAX_HEDGES = int(os.environ.get("SURVEY_MAX_HEDGES", "1"))
+HEALTH_WINDOW = 50  # derniers appels retenus par backend
+MIN_SAMPLES = 10  # nombre d'appels avant de se fier aux percentiles observés
+CIRCUIT_FAILURES = 3  # échecs consécutifs avant de mettre un backend à l'écart
+CIRCUIT_COOLDOWN = float(os.environ.get("SURVEY_CIRCUIT_COOLDOWN", "30"))
+DEFAULT_LATENCY = 30.0  # latence supposée d'un backend encore jamais appelé
+# Nombre de requêtes simultanées par service : Ollama selon ses slots parallèles,
+# OpenAI/Anthropic selon les limites de débit du compte.
+BACKEND_LIMITS = {
+    "Ollama (Local)": int(os.environ.get("OLLAMA_NUM_PARALLEL", "1")),
+    "OpenAI (ChatGPT)": int(os.environ.get("OPENAI_MAX_CONCURRENCY", "8")),
+    "Claude (Anthropic)": int(os.environ.get("ANTHROPIC_MAX_CONCURRENCY", "4"))
+}
+
+RouteResult = namedtuple("RouteResult", ["service", "text", "result"])
+
+
+class RouteError(RuntimeError):
+    pass
+
+
+class BackendHealth:
+    def __init__(self):
+        self.calls = deque(maxlen=HEALTH_WINDOW)  # (succès, durée totale, délai du premier token)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, ok, elapsed, first_token=None):
+        with self._lock:
+            self.calls.append((ok, elapsed, first_token))
+            if ok:
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+                if self.consecutive_failures >= CIRCUIT_FAILURES:
+                    self.open_until = time.time() + CIRCUIT_COOLDOWN
+
+    @property
+    def available(self):
+        # Après le délai, un nouvel essai est permis (semi-ouvert) ; un échec de plus referme le circuit
+        return time.time() >= self.open_until
+
+    def error_rate(self):
+        with self._lock:
+            return sum(1 for ok, _, _ in self.calls if not ok) / len(self.calls) if self.calls else 0.0
+
+    def percentile(self, q, first_token=False):
+        with self._lock:
+            values = sorted(ft if first_token else elapsed for ok, elapsed, ft in self.calls if ok and (ft is not None or not first_token))
+        if len(values) < MIN_SAMPLES:
+            return None
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def score(self):
+        # Latence attendue pénalisée par le taux d'erreur : plus petit = meilleur
+        latency = self.percentile(0.9)
+        return (latency if latency is not None else DEFAULT_LATENCY) * (1 + 4 * self.error_rate())
+
+    def summary(self):
+        return {
+            "calls": len(self.calls),
+            "error_rate": round(self.error_rate(), 3),
+            "p50": self.percentile(0.5),
+            "p90": self.percentile(0.9),
+            "first_token_p95": self.percentile(0.95, first_token=True),
+            "available": self.available
+        }
+
+
+class Attempt:
+    def __init__(self, service):
+        self.service = service
+        self.text = ""
+        self.result = None
+        self.error = None
+        self.started_at = time.perf_counter()
+        self.first_token_at = None
+        self.last_activity = self.started_at
+        self.slot = False  # vrai une fois un slot du service obtenu
+        self.finished = False
+        self.validated = False
+        self.cancel = threading.Event()
+
+    def check(self, validate, text):
+        # Appelée par le cache avant d'enregistrer la réponse ; le résultat est conservé pour le routeur
+        self.result = validate(text)
+        self.validated = True
+        return self.result
+
+
+class Router:
+    def __init__(self, max_workers=64, limits=None):
+        self.health = {service: BackendHealth() for service in SERVICES}
+        # Chaque tentative (service choisi, repli ou requête doublée) prend un slot de son propre service :
+        # un repli vers Ollama respecte OLLAMA_NUM_PARALLEL quelle que soit la file d'origine de la tâche
+        limits = dict(BACKEND_LIMITS, **(limits or {}))
+        self.slots = {service: threading.BoundedSemaphore(max(1, limits.get(service, 1))) for service in SERVICES}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="route")
+
+    def route(self, service, api_keys=None, fallback=None):
+        # Le service choisi passe en premier tant que son circuit est fermé ; les autres
+        # backends configurés suivent, du plus sain au moins sain.
+        api_keys = api_keys or {}
+        fallback = ROUTE_FALLBACK if fallback is None else fallback
+        if not fallback:
+            return [service]
+        configured = [s for s in SERVICES if s == service or s == "Ollama (Local)" or api_keys.get(s)]
+        others = sorted((s for s in configured if s != service), key=lambda s: self.health[s].score())
+        candidates = [service] + others
+        healthy = [s for s in candidates if self.health[s].available]
+        return healthy + [s for s in candidates if s not in healthy]
+
+    def hedge_delay(self, service, hedge_after=None):
+        value = HEDGE_AFTER if hedge_after is None else hedge_after
+        if value == "auto":
+            return self.health[service].percentile(0.95, first_token=True)
+        return float(value) if value not in ("", None) else None
+
+    def generate(self, prompt, service, api_keys=None, structured=False, use_cache=True, fallback=None,
+                 hedge_after=None, timeout=None, on_token=None, cancel=None, validate=None):
+        api_keys = dict(api_keys or {})
+        timeout = ROUTE_TIMEOUT if timeout is None else timeout
+        candidates = self.route(service, api_keys, fallback)
+        hedge = self.hedge_delay(candidates[0], hedge_after)
+        # validate : transforme le texte complet en résultat, ou lève une exception pour passer au backend suivant
+        validate = validate or (parse_survey if structured else self._validate_text)
+        events = queue.Queue()
+        live, errors = [], []
+        hedges = 0
+        leader = None
+        pending = deque(candidates)
+
+        def launch(reason=None):
+            if not pending:
+                return None
+            next_service = pending.popleft()
+            if reason:
+                increment("survey_route_" + reason + "_total", backend=BACKEND_NAMES[next_service])
+            attempt = Attempt(next_service)
+            live.append(attempt)
+            self._executor.submit(self._run, attempt, prompt, api_keys.get(next_service), structured, use_cache, validate, events)
+            return attempt
+
+        start = time.perf_counter()
+        launch()
+        try:
+            while live:
+                if cancel is not None and cancel.is_set():
+                    return None
+                try:
+                    finished = events.get(timeout=0.05)
+                except queue.Empty:
+                    finished = None
+                if finished is not None and finished in live:
+                    live.remove(finished)
+                    if finished.error is None:
+                        observe("survey_route_seconds", time.perf_counter() - start, backend=BACKEND_NAMES[finished.service])
+                        return RouteResult(finished.service, finished.text, finished.result)
+                    errors.append(f"{finished.service}: {finished.error}")
+                    if not live:
+                        launch("fallbacks")
+                now = time.perf_counter()
+                for attempt in list(live):
+                    # Un backend bloqué (file GPU saturée, connexion figée) est abandonné au profit du suivant ;
+                    # sans autre backend à lancer, la dernière tentative va jusqu'au bout (chargement lent du modèle)
+                    if (pending or len(live) > 1) and now - attempt.last_activity > timeout:
+                        attempt.cancel.set()
+                        live.remove(attempt)
+                        errors.append(f"{attempt.service}: no output for {timeout:.0f}s")
+                        if attempt.slot:  # l'attente d'un slot n'est pas une panne du backend
+                            self.health[attempt.service].record(False, now - attempt.started_at)
+                        if not live:
+                            launch("fallbacks")
+                if hedge is not None and hedges < MAX_HEDGES and len(live) == 1:
+                    attempt = live[0]
+                    if attempt.first_token_at is None and now - attempt.started_at > hedge and launch("hedges"):
+                        hedges += 1
+                # Le flux affiché suit la tentative la plus avancée
+                if on_token is not None:
+                    started = [a for a in live if a.first_token_at is not None]
+                    if started:
+                        if leader not in started:
+                            leader = min(started, key=lambda a: a.first_token_at)
+                        on_token(leader.service, leader.text)
+            raise RouteError("; ".join(errors) or "Error: Service not configured properly.")
+        finally:
+            for attempt in live:
+                attempt.cancel.set()
+
+    def _validate_text(self, text):
+        text = strip_think(text)
+        if not text.strip():
+            raise ValueError("Empty response from the model.")
+        return text
+
+    def _run(self, attempt, prompt, api_key, structured, use_cache, validate, events):
+        health = self.health[attempt.service]
+        slots = self.slots[attempt.service]
+        while not slots.acquire(timeout=0.05):
+            if attempt.cancel.is_set():
+                attempt.error = "cancelled while waiting for a slot"
+                attempt.finished = True
+                events.put(attempt)
+                return
+        attempt.slot = True
+        attempt.started_at = attempt.last_activity = time.perf_counter()
+        try:
+            tokens = stream_ai_service(prompt, attempt.service, api_key=api_key, use_cache=use_cache, structured=structured,
+                                       validate=lambda text: attempt.check(validate, text))
+            for token in tokens:
+                attempt.last_activity = time.perf_counter()
+                if attempt.first_token_at is None:
+                    attempt.first_token_at = attempt.last_activity
+                attempt.text += token
+                if attempt.cancel.is_set():
+                    tokens.close()
+                    return
+            if not attempt.validated:
+                attempt.check(validate, attempt.text)
+            now = time.perf_counter()
+            health.record(True, now - attempt.started_at, (attempt.first_token_at or now) - attempt.started_at)
+        except Exception as e:
+            attempt.error = str(e)
+            if is_configuration_error(e):
+                # Santé partagée par toutes les sessions : une clé absente ou refusée n'ouvre pas le circuit des autres
+                increment("survey_generation_failures_total", backend=BACKEND_NAMES[attempt.service], reason="configuration")
+            elif not attempt.cancel.is_set():
+                health.record(False, time.perf_counter() - attempt.started_at)
+                increment("survey_generation_failures_total", backend=BACKEND_NAMES[attempt.service], reason="route")
+        finally:
+            slots.release()
+            attempt.finished = True
+            events.put(attempt)
+
+    def health_summary(self):
+        return {service: health.summary() for service, health in self.health.items()}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_router():
+    # Santé des backends partagée par tout le processus (sessions Streamlit, lots)
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = Router()
+        return _router
@@ -0,0 +1,185 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Instrumentation des étapes coûteuses : histogrammes de latence, compteurs (tokens, réparations, cache),
+# exposés au format texte Prometheus et, en option, journalisés en JSONL
+METRICS_LOG = os.environ.get("SURVEY_METRICS_LOG")
+METRICS_PORT = os.environ.get("SURVEY_METRICS_PORT")
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_server = None
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Estimation par la borne supérieure du bucket (suffisant pour le tableau de bord)
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+def _log(metric, value, labels):
+    if not METRICS_LOG:
+        return
+    line = json.dumps({"ts": time.time(), "metric": metric, "labels": labels, "value": value}, ensure_ascii=False)
+    with _lock:
+        with open(METRICS_LOG, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(value)
+    _log(name, value, labels)
+
+def increment(name, value=1, **labels):
+    if not value:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _log(name, value, labels)
+
+@contextmanager
+def timed(stage, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe("survey_stage_seconds", time.perf_counter() - start, stage=stage, **labels)
+
+def record_tokens(backend, prompt_tokens=None, completion_tokens=None, cached_tokens=None):
+    increment("survey_llm_prompt_tokens_total", prompt_tokens or 0, backend=backend)
+    increment("survey_llm_completion_tokens_total", completion_tokens or 0, backend=backend)
+    if cached_tokens:  # tokens de prompt servis par le cache de préfixe du fournisseur
+        increment("survey_llm_cached_prompt_tokens_total", cached_tokens, backend=backend)
+
+def _cache_counters():
+    import llm_cache
+    cache = llm_cache._cache
+    if cache is None:
+        return {}
+    return {("survey_cache_hits_total", ()): cache.hits, ("survey_cache_misses_total", ()): cache.misses}
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+def render_prometheus():
+    with _lock:
+        histograms = {key: (list(h.counts), h.sum, h.count, h.buckets) for key, h in _histograms.items()}
+        counters = dict(_counters)
+    counters.update(_cache_counters())
+    lines = []
+    seen = set()
+    for (name, labels), value in sorted(counters.items()):
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    for (name, labels), (counts, total, count, buckets) in sorted(histograms.items()):
+        if name not in seen:
+            lines.append(f"# TYPE {name} histogram")
+            seen.add(name)
+        cumulative = 0
+        for bound, bucket_count in zip(buckets, counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', bound)])} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+def snapshot():
+    # Résumé pour le panneau d'administration
+    with _lock:
+        stages = [
+            dict(dict(labels), count=h.count, mean=h.sum / h.count if h.count else 0.0, p50=h.quantile(0.5), p95=h.quantile(0.95))
+            for (name, labels), h in sorted(_histograms.items())
+        ]
+        counters = [dict(dict(labels), metric=name, value=value) for (name, labels), value in sorted(_counters.items())]
+    counters += [{"metric": name, "value": value} for (name, _), value in _cache_counters().items()]
+    return {"stages": stages, "counters": counters}
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+def start_metrics_server(port=None):
+    # Point de terminaison Prometheus (/metrics), démarré une seule fois par processus
+    global _server
+    port = port or METRICS_PORT
+    with _lock:
+        if _server is not None or not port:
+            return _server
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                data = render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        _server = ThreadingHTTPServer(("0.0.0.0", int(port)), Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+        return _server
+
+def instrument_stream(tokens, backend):
+    # Sépare l'attente du premier token (réseau + prefill) du temps de décodage
+    start = time.perf_counter()
+    first = None
+    try:
+        for token in tokens:
+            if first is None:
+                first = time.perf_counter()
+                observe("survey_stage_seconds", first - start, stage="time_to_first_token", backend=backend)
+            yield token
+    finally:
+        if first is not None:
+            observe("survey_stage_seconds", time.perf_counter() - first, stage="decode", backend=backend)
@@ -1,41 +1,75 @@
-from ollama import Client
 import re
 import json
+from llm_cache import cached_call, cached_stream
+from llm_clients import get_ollama_client
+from survey_schema import parse_survey
+from prompt_templates import prompt_text
+from metrics import instrument_stream, record_tokens, timed
 
-def generate_question_list(prompt):
-    client = Client(host='http://localhost:11434')
-    response = client.generate(model="llama3:instruct", prompt=prompt)
-    raw_response = response.get('response', '')
-    text_match = re.sub(r'<think>.*?</think>', '', raw_response, flags=re.DOTALL)
-    return text_match.strip()
+OLLAMA_MODEL = "llama3:instruct"
+# Mode JSON d'Ollama : la sortie est contrainte à un objet JSON valide
+OLLAMA_JSON_FORMAT = "json"
 
-def generate_full_survey_with_options(prompt):
-    client = Client(host='http://localhost:11434')
-    for attempt in range(3):  # 3 tentatives maximum
+def strip_think(text):
+    return re.sub(r'<think>.*?</think>', '', text, flags=re.DOTALL).strip()
+
+def json_fence_closed(text):
+    # Vrai dès que la balise fermante du bloc ```json est arrivée
+    return re.search(r'```json\s*.*?```', text, re.DOTALL) is not None
+
+def extract_json(raw_response):
+    if not raw_response:
+        raise ValueError("Réponse vide reçue du modèle.")
+
+    # Extraction du JSON entre ```json et ```
+    json_match = re.search(r'```json\s*(.*?)\s*```', raw_response, re.DOTALL)
+    if json_match:
+        json_str = json_match.group(1)
+        json.loads(json_str)  # Vérifie la validité
+        return json_str
+
+    # Si pas de balises, tente de trouver un JSON brut
+    json_start = raw_response.find('{')
+    json_end = raw_response.rfind('}') + 1
+    if json_start != -1 and json_end != -1:
+        json_str = raw_response[json_start:json_end]
+        json.loads(json_str)  # Vérifie la validité
+        return json_str
+
+    raise ValueError("Aucun JSON valide trouvé dans la réponse.")
+
+def stream_generate(prompt, use_cache=True, structured=False, validate=None):
+    prompt = prompt_text(prompt)  # préfixe statique en tête : Ollama réutilise le cache KV du préfixe commun
+    # Renvoie les tokens au fur et à mesure de leur décodage par le modèle
+    options = {"format": OLLAMA_JSON_FORMAT} if structured else {}
+    def stream():
+        client = get_ollama_client()
+        for chunk in instrument_stream(client.generate(model=OLLAMA_MODEL, prompt=prompt, stream=True, **options), "ollama"):
+            token = chunk.get('response', '')
+            if token:
+                yield token
+            if chunk.get('done'):
+                record_tokens("ollama", chunk.get('prompt_eval_count'), chunk.get('eval_count'))
+    return cached_stream("ollama", OLLAMA_MODEL, prompt, options, stream, use_cache=use_cache, complete=json_fence_closed, validate=validate)
+
+# Appel sans flux de l'API historique (ai_services.call_ai_service)
+@timed("generate_full_survey_with_options", backend="ollama")
+def generate_full_survey_with_options(prompt, use_cache=True):
+    prompt = prompt_text(prompt)
+    # Une seule génération en mode JSON ; une sortie tronquée est réparée plutôt que régénérée
+    options = {"format": OLLAMA_JSON_FORMAT}
+    def generate():
+        client = get_ollama_client()
+        response = client.generate(model=OLLAMA_MODEL, prompt=prompt, **options)
+        record_tokens("ollama", response.get('prompt_eval_count'), response.get('eval_count'))
+        raw_response = response.get('response', '')
+        if not raw_response:
+            raise ValueError("Réponse vide reçue du modèle.")
         try:
-            response = client.generate(model="llama3:instruct", prompt=prompt)
-            raw_response = response.get('response', '')
-            if not raw_response:
-                raise ValueError("Réponse vide reçue du modèle.")
-
-            # Extraction du JSON entre ```json et ```
-            json_match = re.search(r'```json\s*(.*?)\s*```', raw_response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-                json.loads(json_str)  # Vérifie la validité
-                return json_str
-
-            # Si pas de balises, tente de trouver un JSON brut
-            json_start = raw_response.find('{')
-            json_end = raw_response.rfind('}') + 1
-            if json_start != -1 and json_end != -1:
-                json_str = raw_response[json_start:json_end]
-                json.loads(json_str)  # Vérifie la validité
-                return json_str
-
-            raise ValueError("Aucun JSON valide trouvé dans la réponse.")
-        except Exception as e:
-            if attempt < 2:
-                continue  # Réessaye si ce n’est pas la dernière tentative
-            return f"Échec après {attempt + 1} tentatives : {str(e)}. Réponse brute : {raw_response}"
-    return "Échec inattendu : aucune réponse générée."
\ No newline at end of file
+            return json.dumps(parse_survey(raw_response), ensure_ascii=False)
+        except ValueError as e:
+            raise ValueError(f"{str(e)} Réponse brute : {raw_response}")
+    try:
+        return cached_call("ollama", OLLAMA_MODEL, prompt, dict(options, output="survey"), generate, use_cache=use_cache)
+    except Exception as e:
+        return f"Échec de la génération : {str(e)}"
@@ -0,0 +1,156 @@
+import json
+from collections import namedtuple
+from functools import lru_cache
+from string import Template
+
+# Modèles de prompts versionnés. Le préfixe (consignes, format, exemple, standards) est identique
+# d'une génération à l'autre pour une même langue et configuration : il est placé en tête pour que
+# le cache de préfixe d'Ollama (KV) et le prompt caching d'OpenAI/Anthropic puissent le réutiliser.
+# Les parties variables (entité, contexte, plan) viennent en dernier.
+TEMPLATE_VERSION = "2"
+CHARS_PER_TOKEN = 4  # estimation grossière, suffisante pour suivre la taille des prompts
+
+RenderedPrompt = namedtuple("RenderedPrompt", ["prefix", "suffix", "version"])
+
+OUTLINE_PREFIX = Template("""You are an expert survey designer. Generate a professional survey outline.
+Include a mix of question types and conditional logic where appropriate.
+Detail levels: basic: 5-7 questions, detailed: 8-12, very detailed: 12+.
+Output as plain text with sections and question types in parentheses, entirely in $language.
+Language: Generate all content exclusively in $language.
+Example in $language:
+$example
+Standards to follow:
+$standards
+""")
+
+OUTLINE_SUFFIX = Template("""Question types to use: $question_types.
+Survey for '$entity_name' titled '$survey_title'.
+Context: $survey_context.
+Objectives: $objectives.
+Sector: $sector.
+Target audience: $target_groups, approximately $target_size respondents.
+Structure: $sections sections.
+Detail level: $detail_level.
+Estimated duration: $duration minutes.
+Tone: $tone.
+Additional instructions: $custom_instructions.
+""")
+
+SURVEY_PREFIX = Template("""You are an expert survey designer. Create a complete, professional survey from the outline given at the end.
+Output as a JSON object with 'intro', 'questions', and 'outro', entirely in $language.
+Language: Generate all content exclusively in $language.
+For each question: include 'type', 'text', 'options' (set to null for open-ended questions), and 'condition' (e.g., "If Q2 = Yes" for question 2).
+Multiple-choice: 4+ relevant options. Single-choice: scale (e.g., 1-5, Yes/No).
+$format_instructions
+Example in $language:
+$example
+Standards to follow:
+$standards
+Include in the 'intro' the following requirements based on the selected standards (or ISO 20252 by default):
+$intro_standards
+""")
+
+SURVEY_SUFFIX = Template("""Question types to use: $question_types.
+Context: $survey_context.
+Objectives: $objectives.
+Sector: $sector.
+Target audience: $target_groups, approximately $target_size respondents.
+Structure: $sections sections.
+Detail level: $detail_level.
+Estimated duration: $duration minutes.
+Tone: $tone.
+Additional instructions: $custom_instructions.
+Outline:
+$outline
+""")
+
+TRANSLATION_PREFIX = Template("""You are a professional survey translator. Translate survey texts from $source into $target.
+Keep the meaning, tone and scale wording of each text; keep placeholders, numbers and proper names unchanged.
+Answer options of the same question must stay distinct from each other after translation.
+The input is a JSON object mapping ids to texts. Return only a JSON object with exactly the same ids, each mapped to its translation in $target, without markdown fences or any other text.
+""")
+
+TRANSLATION_SUFFIX = Template("""Texts to translate:
+$texts
+""")
+
+# Exemples par langue (clé : code interne de LANGUAGES)
+OUTLINE_EXAMPLES = {
+    "French": "Section 1: Satisfaction\n- Comment êtes-vous satisfait ? (Ouvertes)\n- Recommanderiez-vous ? (Choix unique)\n- Si oui, pourquoi ? (Ouvertes, conditionnelle)",
+    "English": "Section 1: Satisfaction\n- How satisfied are you? (Open-ended)\n- Would you recommend? (Single-choice)\n- If yes, why? (Open-ended, conditional)",
+    "Spanish": "Section 1: Satisfacción\n- ¿Qué tan satisfecho está? (Abiertas)\n- ¿Nos recomendaría? (Opción única)\n- Si es así, ¿por qué? (Abiertas, condicional)",
+    "Arabic": "Section 1: الرضا\n- ما مدى رضاك؟ (مفتوحة)\n- هل توصي بنا؟ (اختيار واحد)\n- إذا كانت الإجابة نعم، لماذا؟ (مفتوحة، مشروطة)"
+}
+SURVEY_EXAMPLES = {
+    "French": {
+        "intro": "Merci de participer à cette enquête. Cette enquête respecte les exigences suivantes:\n- ISO 20252: Assurer clarté, transparence et cohérence dans la conception des questions.",
+        "questions": [
+            {"type": "Choix unique", "text": "Recommanderiez-vous notre service ?", "options": ["Oui", "Non"], "condition": None},
+            {"type": "Ouvertes", "text": "Si oui, pourquoi ?", "options": None, "condition": "If Q1 = Oui"}
+        ],
+        "outro": "Merci !"
+    },
+    "English": {
+        "intro": "Thank you for participating in this survey. This survey adheres to the following requirements:\n- ISO 20252: Ensure clarity, transparency, and consistency in question design.",
+        "questions": [
+            {"type": "Single-choice", "text": "Would you recommend our service?", "options": ["Yes", "No"], "condition": None},
+            {"type": "Open-ended", "text": "If yes, why?", "options": None, "condition": "If Q1 = Yes"}
+        ],
+        "outro": "Thank you!"
+    },
+    "Spanish": {
+        "intro": "Gracias por participar en esta encuesta. Esta encuesta cumple con los siguientes requisitos:\n- ISO 20252: Garantizar claridad, transparencia y coherencia en el diseño de las preguntas.",
+        "questions": [
+            {"type": "Opción única", "text": "¿Recomendaría nuestro servicio?", "options": ["Sí", "No"], "condition": None},
+            {"type": "Abiertas", "text": "Si es así, ¿por qué?", "options": None, "condition": "If Q1 = Sí"}
+        ],
+        "outro": "¡Gracias!"
+    },
+    "Arabic": {
+        "intro": "شكرًا لمشاركتك في هذا الاستبيان. يلتزم هذا الاستبيان بالمتطلبات التالية:\n- ISO 20252: ضمان الوضوح والشفافية والاتساق في تصميم الأسئلة.",
+        "questions": [
+            {"type": "اختيار واحد", "text": "هل توصي بخدمتنا؟", "options": ["نعم", "لا"], "condition": None},
+            {"type": "مفتوحة", "text": "إذا كانت الإجابة نعم، لماذا؟", "options": None, "condition": "If Q1 = نعم"}
+        ],
+        "outro": "شكرًا!"
+    }
+}
+
+
+@lru_cache(maxsize=256)
+def outline_prefix(language_code, language, standards):
+    return OUTLINE_PREFIX.substitute(language=language, example=OUTLINE_EXAMPLES.get(language_code, OUTLINE_EXAMPLES["English"]), standards=standards)
+
+@lru_cache(maxsize=256)
+def survey_prefix(language_code, language, standards, intro_standards, structured):
+    example = json.dumps(SURVEY_EXAMPLES.get(language_code, SURVEY_EXAMPLES["English"]), ensure_ascii=False, indent=4)
+    if structured:
+        format_instructions = "Return only the JSON object, without markdown fences or any other text."
+    else:
+        format_instructions = "Wrap in ```json and ``` markers."
+        example = f"```json\n{example}\n```"
+    return SURVEY_PREFIX.substitute(language=language, format_instructions=format_instructions, example=example,
+                                    standards=standards, intro_standards=intro_standards)
+
+@lru_cache(maxsize=64)
+def translation_prefix(source, target):
+    return TRANSLATION_PREFIX.substitute(source=source, target=target)
+
+def render(prefix, suffix_template, **values):
+    return RenderedPrompt(prefix, suffix_template.substitute(**values), TEMPLATE_VERSION)
+
+def prompt_text(prompt):
+    return prompt.prefix + prompt.suffix if isinstance(prompt, RenderedPrompt) else prompt
+
+def split_prompt(prompt):
+    # (préfixe réutilisable, partie variable) ; un prompt brut n'a pas de préfixe
+    return (prompt.prefix, prompt.suffix) if isinstance(prompt, RenderedPrompt) else ("", prompt)
+
+def prompt_stats(prompt):
+    prefix, suffix = split_prompt(prompt)
+    return {
+        "chars": len(prefix) + len(suffix),
+        "tokens": (len(prefix) + len(suffix)) // CHARS_PER_TOKEN,
+        "prefix_tokens": len(prefix) // CHARS_PER_TOKEN,
+        "version": prompt.version if isinstance(prompt, RenderedPrompt) else None
+    }
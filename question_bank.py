@@ -0,0 +1,292 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from incremental_generation import remap_condition
+from llm_clients import get_ollama_client
+from survey_model import Survey, as_survey
+from survey_validation import validate_survey
+from metrics import increment, timed
+
+# Banque de questions : les questions validées des questionnaires générés sont indexées par leur
+# embedding (Ollama) pour repérer les doublons d'un questionnaire et proposer des questions existantes
+# au moment du plan. numpy n'est importé qu'à la première utilisation.
+BANK_PATH = os.environ.get("SURVEY_BANK_PATH", os.path.join(".cache", "question_bank.sqlite"))
+EMBED_MODEL = os.environ.get("SURVEY_EMBED_MODEL", "nomic-embed-text")
+DEDUPE_THRESHOLD = float(os.environ.get("SURVEY_DEDUPE_THRESHOLD", "0.92"))  # similarité cosinus entre deux questions en double
+MERGE_THRESHOLD = 0.97  # question déjà en banque : son compteur d'usage augmente au lieu d'un nouvel enregistrement
+SUGGEST_MIN_SCORE = float(os.environ.get("SURVEY_BANK_MIN_SCORE", "0.5"))
+LSH_TABLES = 16  # tables de hachage indépendantes (rappel)
+LSH_BITS = 10  # hyperplans par table (sélectivité)
+EXACT_BELOW = 2000  # en dessous, le parcours exhaustif est plus rapide que les seaux
+
+BankQuestion = namedtuple("BankQuestion", ["id", "text", "type", "options", "sector", "survey_type", "language", "uses", "score"])
+BANK_COLUMNS = "id, text, type, options, sector, survey_type, language, uses"
+
+
+def _normalize(text):
+    return " ".join(str(text).split()).lower()
+
+def ollama_embed(texts, model=EMBED_MODEL):
+    client = get_ollama_client()
+    if hasattr(client, "embed"):  # ollama >= 0.3 : tout le lot en un appel
+        return [list(vector) for vector in client.embed(model=model, input=texts)["embeddings"]]
+    return [list(client.embeddings(model=model, prompt=text)["embedding"]) for text in texts]
+
+
+class LSHIndex:
+    # Hachage par hyperplans aléatoires (similarité cosinus) : chaque table range un vecteur selon le signe
+    # de ses projections, et une requête ne compare que les vecteurs partageant un seau dans au moins une table.
+    # Les candidats sont ensuite classés par similarité exacte.
+    def __init__(self, dim, tables=LSH_TABLES, bits=LSH_BITS, seed=0):
+        import numpy as np
+        rng = np.random.default_rng(seed)
+        self.planes = rng.standard_normal((tables * bits, dim)).astype(np.float32)
+        self.tables, self.bits = tables, bits
+        self.powers = 1 << np.arange(bits)
+        self.buckets = [defaultdict(list) for _ in range(tables)]
+        self.ids = []
+        self._vectors = np.empty((64, dim), dtype=np.float32)  # capacité doublée au besoin
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def vectors(self):
+        return self._vectors[:len(self.ids)]
+
+    def _codes(self, vectors):
+        # (n, tables) : code entier du seau de chaque vecteur dans chaque table
+        signs = (vectors @ self.planes.T > 0).reshape(len(vectors), self.tables, self.bits)
+        return signs @ self.powers
+
+    def add(self, ids, vectors):
+        import numpy as np
+        start = len(self.ids)
+        if start + len(vectors) > len(self._vectors):
+            grown = np.empty((max(2 * len(self._vectors), start + len(vectors)), self._vectors.shape[1]), dtype=np.float32)
+            grown[:start] = self._vectors[:start]
+            self._vectors = grown
+        self._vectors[start:start + len(vectors)] = vectors
+        # Identifiants et vecteurs d'abord : un seau ne désigne jamais une ligne encore absente
+        self.ids.extend(ids)
+        for row, codes in enumerate(self._codes(vectors).tolist(), start):
+            for table, code in enumerate(codes):
+                self.buckets[table][code].append(row)
+
+    def candidates(self, vector):
+        import numpy as np
+        rows = [self.buckets[table].get(code, ()) for table, code in enumerate(self._codes(vector[None])[0].tolist())]
+        return np.unique(np.fromiter((row for bucket in rows for row in bucket), dtype=np.int64))
+
+    def search(self, vector, k=10, exact=None):
+        # [(identifiant, similarité)] des k plus proches ; parcours exhaustif pour un petit index
+        import numpy as np
+        if not self.ids:
+            return []
+        vector = np.asarray(vector, dtype=np.float32)  # un vecteur float64 forcerait la conversion de tout l'index
+        exact = len(self.ids) < EXACT_BELOW if exact is None else exact
+        rows = None if exact else self.candidates(vector)
+        if rows is not None and len(rows) < k:
+            rows = None  # trop peu de candidats : le parcours exhaustif garantit k résultats
+        scores = (self.vectors if rows is None else self.vectors[rows]) @ vector
+        top = np.argpartition(-scores, k - 1)[:k] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(-scores[top])]
+        return [(self.ids[row if rows is None else rows[row]], float(scores[row])) for row in top]
+
+
+class QuestionBank:
+    def __init__(self, path, embed=None, model=EMBED_MODEL):
+        self.path = path
+        self.model = model
+        self._embed = embed or (lambda texts: ollama_embed(texts, model))
+        self._lock = threading.Lock()
+        self._indexes = None  # {langue: LSHIndex}, construits à la première recherche
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT, type TEXT, options TEXT, sector TEXT, survey_type TEXT, "
+            "language TEXT, uses INTEGER, vector BLOB, created_at REAL, model TEXT);"
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB);"
+        )
+        # Chaque vecteur est rattaché au modèle qui l'a produit : changer SURVEY_EMBED_MODEL (autre dimension)
+        # ne mélange pas les espaces ; les lignes d'une banque antérieure sans modèle sont ignorées
+        if "model" not in [row[1] for row in self._conn.execute("PRAGMA table_info(questions)")]:
+            self._conn.execute("ALTER TABLE questions ADD COLUMN model TEXT")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_questions_model_language ON questions(model, language)")
+        self._conn.commit()
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model}\0{_normalize(text)}".encode("utf-8")).hexdigest()
+
+    def embed(self, texts):
+        # Matrice (n, dim) de vecteurs unitaires ; les embeddings déjà calculés sont relus en base
+        import numpy as np
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            cached = {}
+            for i in range(0, len(keys), 500):
+                chunk = list(set(keys[i:i + 500]))
+                cached.update(self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({', '.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        missing = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in cached))
+        increment("survey_bank_embeddings_cached_total", len(texts) - len(missing))
+        if missing:
+            with timed("embedding", model=self.model):
+                computed = np.asarray(self._embed(missing), dtype=np.float32)
+            rows = [(self._key(text), vector.tobytes()) for text, vector in zip(missing, computed)]
+            with self._lock:
+                self._conn.executemany("INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows)
+                self._conn.commit()
+            cached.update(rows)
+        vectors = np.stack([np.frombuffer(cached[key], dtype=np.float32) for key in keys])
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _index(self, language, dim=None):
+        import numpy as np
+        with self._lock:
+            if self._indexes is None:
+                self._indexes = {}
+                by_language = defaultdict(lambda: ([], []))
+                rows = self._conn.execute("SELECT id, language, vector FROM questions WHERE model = ? ORDER BY id", (self.model,))
+                for row_id, row_language, vector in rows:
+                    by_language[row_language][0].append(row_id)
+                    by_language[row_language][1].append(np.frombuffer(vector, dtype=np.float32))
+                for row_language, (ids, vectors) in by_language.items():
+                    self._indexes[row_language] = LSHIndex(len(vectors[0]))
+                    self._indexes[row_language].add(ids, np.stack(vectors))
+            if language not in self._indexes and dim is not None:
+                self._indexes[language] = LSHIndex(dim)
+            return self._indexes.get(language)
+
+    @timed("question_bank", op="add")
+    def add_survey(self, survey, config, issues=None):
+        # Seules les questions sans problème de validation entrent dans la banque, sans leur condition
+        # (propre au questionnaire) ; une question quasi identique déjà présente voit son usage augmenter.
+        survey = as_survey(survey)
+        issues = validate_survey(survey) if issues is None else issues
+        rejected = {int(issue.prefix[1:]) - 1 for issue in issues if issue.prefix.startswith("Q")}
+        questions = [q for i, q in enumerate(survey.questions) if i not in rejected and q.text]
+        if not questions:
+            return 0
+        language = config.get("survey_lang", "")
+        vectors = self.embed([q.text for q in questions])
+        index = self._index(language, vectors.shape[1])
+        added, reused = [], []
+        now = time.time()
+        with self._lock:
+            for q, vector in zip(questions, vectors):
+                nearest = index.search(vector, 1)
+                if nearest and nearest[0][1] >= MERGE_THRESHOLD:
+                    reused.append(nearest[0][0])
+                    continue
+                row_id = self._conn.execute(
+                    "INSERT INTO questions (text, type, options, sector, survey_type, language, uses, vector, created_at, model) "
+                    "VALUES (?, ?, ?, ?, ?, ?, 1, ?, ?, ?)",
+                    (q.text, q.type, json.dumps(list(q.options) if q.options is not None else None, ensure_ascii=False), config.get("sector", ""),
+                     config.get("survey_context", ""), language, vector.tobytes(), now, self.model)
+                ).lastrowid
+                index.add([row_id], vector[None])
+                added.append(row_id)
+            self._conn.executemany("UPDATE questions SET uses = uses + 1 WHERE id = ?", [(row_id,) for row_id in reused])
+            self._conn.commit()
+        increment("survey_bank_added_total", len(added))
+        increment("survey_bank_reused_total", len(reused))
+        return len(added)
+
+    def _rows(self, scored):
+        if not scored:
+            return []
+        with self._lock:
+            rows = {row[0]: row for row in self._conn.execute(
+                f"SELECT {BANK_COLUMNS} FROM questions WHERE id IN ({', '.join('?' * len(scored))})", [row_id for row_id, _ in scored]
+            )}
+        return [BankQuestion(*rows[row_id][:3], json.loads(rows[row_id][3]), *rows[row_id][4:], score)
+                for row_id, score in scored if row_id in rows]
+
+    @timed("question_bank", op="search")
+    def search(self, texts, language, k=10, min_score=0.0):
+        # Questions de la banque les plus proches d'un ou plusieurs textes, dans la langue du questionnaire
+        texts = [texts] if isinstance(texts, str) else list(texts)
+        index = self._index(language)
+        if index is None or not len(index) or not texts:
+            return []
+        best = {}
+        vectors = self.embed(texts)
+        with self._lock:  # add_survey peut enrichir l'index depuis une autre session
+            for vector in vectors:
+                for row_id, score in index.search(vector, k):
+                    if score >= min_score and score > best.get(row_id, -1):
+                        best[row_id] = score
+        return self._rows(sorted(best.items(), key=lambda item: -item[1])[:k])
+
+    def suggest(self, params, k=8, min_score=SUGGEST_MIN_SCORE):
+        # Une requête par objectif, dans le contexte du questionnaire : questions à reprendre dans le plan
+        context = f"{params.get('survey_title', '')}. {params.get('survey_context', '')}. {params.get('sector', '')}"
+        queries = [f"{context}. {objective}" for objective in params.get("objectives") or []] or [context]
+        return self.search(queries, params.get("survey_lang", ""), k=k, min_score=min_score)
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM questions WHERE model = ?", (self.model,)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+@timed("question_bank", op="dedupe")
+def find_duplicates(survey, bank, threshold=DEDUPE_THRESHOLD):
+    # [(question, question antérieure dont elle est le doublon, similarité)], indices à partir de 0
+    texts = [q.text for q in as_survey(survey).questions]
+    positions = [i for i, text in enumerate(texts) if text.strip()]
+    if len(positions) < 2:
+        return []
+    vectors = bank.embed([texts[i] for i in positions])
+    index = LSHIndex(vectors.shape[1])
+    duplicates = []
+    for i, vector in zip(positions, vectors):
+        nearest = index.search(vector, 1)
+        if nearest and nearest[0][1] >= threshold:
+            duplicates.append((i, nearest[0][0], nearest[0][1]))
+        else:
+            index.add([i], vector[None])
+    increment("survey_bank_duplicates_total", len(duplicates))
+    return duplicates
+
+def remove_duplicates(survey, duplicates):
+    # Supprime les doublons ; une condition portant sur une question supprimée renvoie à la question conservée
+    removed = {i: kept for i, kept, _ in duplicates}
+    survey = as_survey(survey)
+    questions = survey.questions
+    mapping, kept_questions = {}, []
+    for i, q in enumerate(questions):
+        if i not in removed:
+            mapping[i] = len(kept_questions)
+            kept_questions.append(q)
+    for i, kept in removed.items():
+        mapping[i] = mapping[kept]
+    result = [q.replace(condition=remap_condition(q.condition, mapping)) if q.condition else q for q in kept_questions]
+    return Survey(survey.intro, result, survey.outro)
+
+
+_bank = None
+_bank_lock = threading.Lock()
+
+def get_bank():
+    global _bank
+    with _bank_lock:
+        if _bank is None:
+            _bank = QuestionBank(BANK_PATH)
+        return _bank
@@ -0,0 +1,62 @@
+import contextlib
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_router import BACKEND_LIMITS, get_router
+from survey_prompts import build_section_prompt
+
+# En-têtes de section du plan généré à l'étape 2 ("Section 2: ...", "**Section 2 :**", "Sección 2:", "القسم 2:")
+SECTION_HEADER = re.compile(r'^\s*[#*]*\s*(?:Section|Sección|القسم)\s+\d+\s*[*]*\s*[:：.\-–]', re.IGNORECASE | re.MULTILINE)
+QUESTION_REF = re.compile(r'\bQ(\d+)\b')
+
+
+def split_outline_sections(outline):
+    starts = [m.start() for m in SECTION_HEADER.finditer(outline)]
+    if len(starts) < 2:
+        return [outline.strip()] if outline.strip() else []
+    # Le texte éventuel avant la première section est rattaché à celle-ci
+    starts[0] = 0
+    bounds = starts + [len(outline)]
+    return [outline[bounds[i]:bounds[i + 1]].strip() for i in range(len(starts))]
+
+def _shift_condition(condition, offset):
+    if isinstance(condition, str):
+        return QUESTION_REF.sub(lambda m: f"Q{int(m.group(1)) + offset}", condition)
+    if isinstance(condition, dict) and "question" in condition:
+        condition = dict(condition)
+        condition["question"] = _shift_condition(str(condition["question"]), offset)
+    return condition
+
+def merge_sections(parts):
+    # Fusionne les questionnaires partiels : numérotation globale et conditions "If Qn = ..." réécrites
+    survey = {"intro": "", "questions": [], "outro": ""}
+    for section_number, part in enumerate(parts, 1):
+        offset = len(survey["questions"])
+        for q in part.get("questions", []):
+            q = dict(q)
+            if q.get("condition"):
+                q["condition"] = _shift_condition(q["condition"], offset)
+            q["section"] = section_number
+            survey["questions"].append(q)
+        if part.get("intro") and not survey["intro"]:
+            survey["intro"] = part["intro"]
+        if part.get("outro"):
+            survey["outro"] = part["outro"]
+    return survey
+
+def build_section_prompts(params, outline, structured=True):
+    sections = split_outline_sections(outline)
+    return [build_section_prompt(params, section, i, len(sections), structured=structured) for i, section in enumerate(sections, 1)]
+
+def generate_survey_by_sections(params, outline, service, api_key=None, use_cache=True, max_workers=None, limit=None, api_keys=None, fallback=None, hedge_after=None):
+    # Les sections sont générées en parallèle : la durée dépend de la plus longue, pas du total
+    prompts = build_section_prompts(params, outline)
+    api_keys = dict(api_keys or {}, **({service: api_key} if api_key else {}))
+    def generate(prompt):
+        # Chaque section est routée séparément : une section bloquée peut se replier sans relancer les autres
+        with limit or contextlib.nullcontext():
+            return get_router().generate(prompt, service, api_keys=api_keys, structured=True, use_cache=use_cache, fallback=fallback, hedge_after=hedge_after).result
+    workers = max_workers or BACKEND_LIMITS.get(service, 1)
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(prompts) or 1))) as executor:
+        parts = list(executor.map(generate, prompts))
+    return merge_sections(parts)
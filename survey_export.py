@@ -0,0 +1,224 @@
+import csv
+import io
+import json
+import sys
+import zipfile
+
+from survey_model import Survey, as_survey
+from metrics import timed
+
+# Exportation en flux : les lignes sont produites une à une (csv.writer, openpyxl en mode write-only,
+# JSON incrémental) sans DataFrame intermédiaire ; les options sont aplaties en colonnes ou en lignes.
+EXPORT_FORMATS = {
+    "JSON": ("survey.json", "application/json"),
+    "Excel": ("survey.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "CSV": ("survey.csv", "text/csv")
+}
+BATCH_FORMATS = {
+    "Excel": ("surveys.xlsx", EXPORT_FORMATS["Excel"][1]),
+    "CSV": ("surveys.csv", "text/csv"),
+    "JSON": ("surveys.jsonl", "application/x-ndjson"),
+    "ZIP": ("surveys.zip", "application/zip")
+}
+LAYOUTS = ["wide", "long"]  # wide : option_1..option_N ; long : une ligne par option
+BASE_COLUMNS = ["number", "section", "type", "text", "condition"]
+EXCEL_SHEET_NAME_MAX = 31
+
+
+def condition_text(condition):
+    # Les conditions valides sont déjà sous la forme "If Qn = valeur" (survey_model)
+    if isinstance(condition, dict):
+        return f"{condition.get('question', '')} = {condition.get('value', '')}"
+    return str(condition) if condition else ""
+
+def max_options(survey):
+    return as_survey(survey).option_count()
+
+def header(layout="wide", option_count=0):
+    if layout == "long":
+        return BASE_COLUMNS + ["option_number", "option"]
+    return BASE_COLUMNS + [f"option_{i}" for i in range(1, option_count + 1)]
+
+def iter_rows(survey, layout="wide", option_count=None):
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+    survey = as_survey(survey)
+    if option_count is None and layout == "wide":
+        option_count = survey.option_count()
+    for number, q in enumerate(survey.questions, 1):
+        base = [number, "" if q.section is None else q.section, q.type, q.text, condition_text(q.condition)]
+        options = list(q.options or ())
+        if layout == "long":
+            if not options:
+                yield base + ["", ""]
+            for i, value in enumerate(options, 1):
+                yield base + [i, value]
+        else:
+            yield base + options + [""] * (option_count - len(options))
+
+def parallel_header(languages, layout="wide", option_count=0):
+    # Traductions côte à côte : colonnes de structure communes, puis type/texte/options par langue
+    columns = ["number", "section", "condition"]
+    for lang in languages:
+        columns += [f"type_{lang}", f"text_{lang}"]
+    if layout == "long":
+        return columns + ["option_number"] + [f"option_{lang}" for lang in languages]
+    return columns + [f"option_{i}_{lang}" for lang in languages for i in range(1, option_count + 1)]
+
+def iter_parallel_rows(surveys, layout="wide", option_count=None):
+    # `surveys` : {langue: questionnaire}, mêmes questions et options dans le même ordre (survey_translation)
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout: {layout}")
+    languages = list(surveys)
+    surveys = {lang: as_survey(surveys[lang]) for lang in languages}
+    if option_count is None and layout == "wide":
+        option_count = surveys[languages[0]].option_count()
+    for number, versions in enumerate(zip(*(surveys[lang].questions for lang in languages)), 1):
+        base = [number, "" if versions[0].section is None else versions[0].section, condition_text(versions[0].condition)]
+        for q in versions:
+            base += [q.type, q.text]
+        options = [list(q.options or ()) for q in versions]
+        if layout == "long":
+            if not options[0]:
+                yield base + [""] * (1 + len(languages))
+            for i in range(len(options[0])):
+                yield base + [i + 1] + [values[i] if i < len(values) else "" for values in options]
+        else:
+            yield base + [value for values in options for value in values + [""] * (option_count - len(values))]
+
+def write_csv(survey, fh, layout="wide"):
+    survey = as_survey(survey)
+    option_count = survey.option_count()
+    writer = csv.writer(fh)
+    writer.writerow(header(layout, option_count))
+    writer.writerows(iter_rows(survey, layout, option_count))
+
+def _sheet_title(name, used):
+    title = "".join("_" if c in "[]:*?/\\" else c for c in str(name))[:EXCEL_SHEET_NAME_MAX] or "survey"
+    candidate, n = title, 1
+    while candidate in used:
+        n += 1
+        suffix = f"_{n}"
+        candidate = title[:EXCEL_SHEET_NAME_MAX - len(suffix)] + suffix
+    used.add(candidate)
+    return candidate
+
+def write_excel(surveys, fh, layout="wide"):
+    # `surveys` : itérable de (nom, questionnaire), une feuille par questionnaire
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    used = set()
+    for name, survey in surveys:
+        sheet = workbook.create_sheet(_sheet_title(name, used))
+        survey = as_survey(survey)
+        option_count = survey.option_count()
+        sheet.append(header(layout, option_count))
+        for row in iter_rows(survey, layout, option_count):
+            sheet.append(row)
+    if not used:
+        workbook.create_sheet("survey")
+    workbook.save(fh)
+
+def write_json(survey, fh):
+    # JSON incrémental : une question sérialisée à la fois
+    survey = as_survey(survey)
+    fh.write('{\n  "intro": ' + json.dumps(survey.intro, ensure_ascii=False) + ',\n  "questions": [')
+    for i, q in enumerate(survey.questions):
+        fh.write(("," if i else "") + "\n    " + json.dumps(q.to_dict(), ensure_ascii=False))
+    fh.write('\n  ],\n  "outro": ' + json.dumps(survey.outro, ensure_ascii=False) + "\n}\n")
+
+def export_survey(survey, export_format, layout="wide"):
+    with timed("export", format=export_format):
+        if export_format == "Excel":
+            output = io.BytesIO()
+            write_excel([("survey", survey)], output, layout)
+            return output.getvalue()
+        output = io.StringIO()
+        if export_format == "CSV":
+            write_csv(survey, output, layout)
+        elif export_format == "JSON":
+            write_json(survey, output)
+        else:
+            raise ValueError(f"Unknown export format: {export_format}")
+        return output.getvalue().encode("utf-8")
+
+def export_translations(surveys, export_format, layout="wide"):
+    # Toutes les langues d'un questionnaire dans un seul fichier
+    with timed("export", format=f"translations_{export_format}"):
+        languages = list(surveys)
+        surveys = {lang: as_survey(surveys[lang]) for lang in languages}
+        option_count = surveys[languages[0]].option_count()
+        if export_format == "Excel":
+            from openpyxl import Workbook
+            workbook = Workbook(write_only=True)
+            sheet = workbook.create_sheet("translations")
+            sheet.append(parallel_header(languages, layout, option_count))
+            for row in iter_parallel_rows(surveys, layout, option_count):
+                sheet.append(row)
+            output = io.BytesIO()
+            workbook.save(output)
+            return output.getvalue()
+        output = io.StringIO()
+        if export_format == "CSV":
+            writer = csv.writer(output)
+            writer.writerow(parallel_header(languages, layout, option_count))
+            writer.writerows(iter_parallel_rows(surveys, layout, option_count))
+        elif export_format == "JSON":
+            json.dump({lang: survey.to_dict() for lang, survey in surveys.items()}, output, ensure_ascii=False, indent=2)
+        else:
+            raise ValueError(f"Unknown export format: {export_format}")
+        return output.getvalue().encode("utf-8")
+
+def export_batch(surveys, fh, export_format, layout="long"):
+    # Plusieurs questionnaires, consommés un par un : classeur unique, CSV unique (colonne "survey"),
+    # JSONL ou archive ZIP (un fichier Excel par questionnaire)
+    with timed("export", format=f"batch_{export_format}"):
+        if export_format == "Excel":
+            write_excel(surveys, fh, layout)
+        elif export_format == "ZIP":
+            with zipfile.ZipFile(fh, "w", zipfile.ZIP_DEFLATED) as archive:
+                used = set()
+                for name, survey in surveys:
+                    with archive.open(_sheet_title(name, used) + ".xlsx", "w") as member:
+                        write_excel([(name, survey)], member, layout)
+        else:
+            text = io.TextIOWrapper(fh, encoding="utf-8", newline="")
+            if export_format == "CSV":
+                # Format long : colonnes identiques quel que soit le nombre d'options de chaque questionnaire
+                writer = csv.writer(text)
+                writer.writerow(["survey"] + header("long"))
+                for name, survey in surveys:
+                    writer.writerows([name] + row for row in iter_rows(survey, "long"))
+            elif export_format == "JSON":
+                for name, survey in surveys:
+                    text.write(json.dumps({"name": name, "survey": as_survey(survey).to_dict()}, ensure_ascii=False) + "\n")
+            else:
+                raise ValueError(f"Unknown export format: {export_format}")
+            text.flush()
+            text.detach()
+
+def read_batch_results(path):
+    # Lecture paresseuse de la sortie JSONL de batch_generate.py
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if record.get("survey"):
+                config = record.get("config") or {}
+                yield config.get("survey_title") or config.get("entity_name") or f"survey_{record.get('index')}", Survey.from_dict(record["survey"])
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Export the surveys of a batch_generate.py JSONL file.")
+    parser.add_argument("input", help="JSONL file written by batch_generate.py")
+    parser.add_argument("-o", "--output", required=True, help="Output file")
+    parser.add_argument("-f", "--format", choices=list(BATCH_FORMATS), default="Excel")
+    parser.add_argument("--layout", choices=LAYOUTS, default="long", help="Options as columns (wide) or one row per option (long)")
+    args = parser.parse_args(argv)
+    with open(args.output, "wb") as fh:
+        export_batch(read_batch_results(args.input), fh, args.format, args.layout)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
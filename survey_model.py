@@ -0,0 +1,204 @@
+import hashlib
+import json
+import sys
+from collections import namedtuple
+from functools import lru_cache
+
+# Modèle du questionnaire : la réponse JSON du modèle (options en chaînes, nombres ou {"value": ...},
+# conditions en chaîne ou en dictionnaire) est normalisée une seule fois à l'entrée. Les options sont
+# internées et les conditions analysées à la construction ; une instance n'est plus modifiée ensuite
+# (une modification produit un nouveau Survey), ce qui permet de mémoriser son empreinte.
+Condition = namedtuple("Condition", ["question", "value", "ref", "raw"])  # question : index 0-based
+QUESTION_KEYS = frozenset(["type", "text", "options", "condition", "section"])
+_intern = sys.intern
+
+
+class ConditionError(ValueError):
+    def __init__(self, key, default, detail):
+        super().__init__(default)
+        self.key = key
+        self.default = default
+        self.detail = detail
+
+
+def normalize_option(opt):
+    if isinstance(opt, dict):
+        opt = opt.get("value", opt)
+    return str(opt).strip().lower()
+
+def parse_condition(condition):
+    # "If Q2 = Yes" ou {"question": "Q2", "value": "Yes"} -> Condition(1, "yes", "If Q2", condition)
+    if isinstance(condition, str):
+        cond_parts = condition.split(" = ")
+        if len(cond_parts) != 2:
+            raise ConditionError("invalid_condition_format", "Invalid condition format", f" ({condition})")
+        cond_q, cond_val = cond_parts
+    elif isinstance(condition, dict):
+        cond_q = condition.get("question", "")
+        cond_val = condition.get("value", "")
+        if not cond_q or not cond_val:
+            raise ConditionError("invalid_condition_dict", "Invalid condition dictionary", f" ({condition})")
+    else:
+        raise ConditionError("unsupported_condition_type", "Unsupported condition type", f" ({condition})")
+
+    cond_q_clean = str(cond_q).replace("If Q", "").strip()
+    try:
+        cond_idx = int(cond_q_clean) - 1
+    except ValueError:
+        raise ConditionError("invalid_question_ref", "Invalid question reference", f" ({cond_q})")
+    return Condition(cond_idx, str(cond_val).strip("'\"").lower(), cond_q, condition)
+
+def _text(value):
+    if type(value) is str:
+        return value
+    return str(value) if value else ""
+
+def _option_text(opt):
+    if isinstance(opt, dict):
+        opt = opt.get("value", opt)
+    return _intern(str(opt))
+
+@lru_cache(maxsize=4096)
+def _option_set(options):
+    # Listes d'options fréquentes (échelles, Oui/Non) partagées entre questions et questionnaires
+    keys = tuple([_intern(opt.strip().lower()) for opt in options])  # comme normalize_option
+    return tuple(map(_intern, options)), keys, frozenset(keys)
+
+
+class Question:
+    __slots__ = ("type", "text", "options", "keys", "key_set", "condition", "parsed", "section", "extra")
+
+    def __init__(self, q_type="", text="", options=None, condition=None, section=None, extra=None):
+        self.type = _intern(_text(q_type))
+        self.text = _text(text)
+        # options : None (question ouverte) ou tuple de textes ; une valeur qui n'est pas une liste compte comme vide
+        if isinstance(options, (list, tuple)):
+            if not all(type(opt) is str for opt in options):
+                options = [_option_text(opt) for opt in options]
+            self.options, self.keys, self.key_set = _option_set(tuple(options))
+        else:
+            self.options, self.keys, self.key_set = None if options is None else (), (), frozenset()
+        self.condition, self.parsed = None, None  # parsed : Condition, ConditionError ou None
+        if condition:
+            try:
+                parsed = parse_condition(condition)
+                if isinstance(condition, dict):
+                    # Forme unique "If Qn = valeur" pour l'affichage et l'export
+                    text = f"If Q{parsed.question + 1} = {str(condition['value']).strip()}"
+                    if text.count(" = ") == 1:
+                        condition, parsed = text, parse_condition(text)
+                self.parsed = parsed
+            except ConditionError as e:
+                self.parsed = e
+            self.condition = condition
+        self.section = section
+        self.extra = extra or {}  # autres champs de la réponse, conservés tels quels
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, Question):
+            return data
+        if not isinstance(data, dict):
+            return cls()
+        extra = None if data.keys() <= QUESTION_KEYS else {key: value for key, value in data.items() if key not in QUESTION_KEYS}
+        return cls(data.get("type"), data.get("text"), data.get("options"), data.get("condition"), data.get("section"), extra)
+
+    def to_dict(self):
+        data = {"type": self.type, "text": self.text, "options": list(self.options) if self.options is not None else None, "condition": self.condition}
+        if self.section is not None:
+            data["section"] = self.section
+        data.update(self.extra)
+        return data
+
+    def replace(self, **changes):
+        fields = {"q_type": self.type, "text": self.text, "options": self.options, "condition": self.condition, "section": self.section, "extra": self.extra}
+        fields.update(changes)
+        return Question(**fields)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class Survey:
+    __slots__ = ("intro", "questions", "outro", "_digest")
+
+    def __init__(self, intro="", questions=(), outro=""):
+        self.intro = _text(intro)
+        self.questions = tuple(questions)
+        self.outro = _text(outro)
+        self._digest = None
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, Survey):
+            return data
+        data = data if isinstance(data, dict) else {}
+        questions = data.get("questions")
+        questions = questions if isinstance(questions, (list, tuple)) else ()
+        return cls(data.get("intro"), [Question.from_dict(q) for q in questions], data.get("outro"))
+
+    def to_dict(self):
+        return {"intro": self.intro, "questions": [q.to_dict() for q in self.questions], "outro": self.outro}
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def to_json(self, indent=None):
+        return json.dumps(self.to_dict(), ensure_ascii=False, indent=indent)
+
+    def to_columns(self):
+        # Une liste par champ (une valeur par question) ; les options sont aplaties avec leurs bornes
+        # (option_offsets[i]:option_offsets[i + 1]), et options_null distingue une question ouverte
+        offsets, values = [0], []
+        for q in self.questions:
+            values.extend(q.options or ())
+            offsets.append(len(values))
+        return {
+            "intro": self.intro,
+            "outro": self.outro,
+            "type": [q.type for q in self.questions],
+            "text": [q.text for q in self.questions],
+            "condition": [q.condition for q in self.questions],
+            "section": [q.section for q in self.questions],
+            "options_null": [q.options is None for q in self.questions],
+            "option_offsets": offsets,
+            "option_values": values
+        }
+
+    @classmethod
+    def from_columns(cls, columns):
+        offsets, values = columns["option_offsets"], columns["option_values"]
+        questions = []
+        for i, (q_type, text, condition, section, null) in enumerate(zip(
+                columns["type"], columns["text"], columns["condition"], columns["section"], columns["options_null"])):
+            options = None if null else values[offsets[i]:offsets[i + 1]]
+            questions.append(Question(q_type, text, options, condition, section))
+        return cls(columns.get("intro"), questions, columns.get("outro"))
+
+    @property
+    def digest(self):
+        # Même empreinte que survey_hash() sur la forme JSON, calculée une seule fois
+        if self._digest is None:
+            self._digest = survey_hash(self.to_dict())
+        return self._digest
+
+    def option_count(self):
+        return max((len(q.options or ()) for q in self.questions), default=0)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __repr__(self):
+        return f"Survey({len(self.questions)} questions)"
+
+
+def as_survey(survey):
+    # Point d'entrée unique des consommateurs : un Survey est utilisé tel quel, un dict est normalisé
+    return survey if isinstance(survey, Survey) else Survey.from_dict(survey)
+
+def survey_hash(survey):
+    if isinstance(survey, Survey):
+        return survey.digest
+    payload = json.dumps(survey, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
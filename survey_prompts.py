@@ -0,0 +1,110 @@
+import json
+
+from metrics import timed
+from prompt_templates import OUTLINE_SUFFIX, SURVEY_SUFFIX, TRANSLATION_SUFFIX, RenderedPrompt, outline_prefix, render, survey_prefix, translation_prefix
+
+# Gestion multilingue
+LANGUAGES = {"Français": "French", "English": "English", "Español": "Spanish", "العربية": "Arabic"}
+DETAIL_LEVELS = {"basic": "basic", "detailed": "detailed", "very_detailed": "very detailed"}
+TONES = {"formal": "formal", "friendly": "friendly", "neutral": "neutral"}
+
+# Standards internationaux
+STANDARDS = {
+    "ISO 20252": "Ensure clarity, transparency, and consistency in question design.",
+    "AAPOR": "Minimize bias, ensure clarity, and pretest questions for reliability.",
+    "ESS": "Ensure cross-cultural comparability and rigorous pretesting.",
+    "OCDE": "Focus on psychometric validity and international comparability.",
+    "ESOMAR": "Respect respondent privacy and avoid intrusive questions."
+}
+
+QUESTION_TYPES_TRANSLATED = {
+    "French": {"Choix unique": "Choix unique", "Choix multiple": "Choix multiple", "Ouvertes": "Ouvertes", "Échelles (1-5)": "Échelles (1-5)", "Conditionnelles": "Conditionnelles"},
+    "English": {"Single Choice": "Single-choice", "Multiple Choice": "Multiple-choice", "Open-ended": "Open-ended", "Scales (1-5)": "Scales (1-5)", "Conditional": "Conditional"},
+    "Spanish": {"Opción única": "Opción única", "Opción múltiple": "Opción múltiple", "Abiertas": "Abiertas", "Escalas (1-5)": "Escalas (1-5)", "Condicionales": "Condicionales"},
+    "Arabic": {"اختيار واحد": "اختيار واحد", "اختيار متعدد": "اختيار متعدد", "مفتوحة": "مفتوحة", "مقاييس (1-5)": "مقاييس (1-5)", "مشروطة": "مشروطة"}
+}
+
+def _type_table():
+    # Type de question (libellé ou valeur, toutes langues) -> position commune dans QUESTION_TYPES_TRANSLATED
+    table = {}
+    for types in QUESTION_TYPES_TRANSLATED.values():
+        for position, (label, value) in enumerate(types.items()):
+            table[label.lower()] = position
+            table[value.lower()] = position
+    return table
+
+TYPE_POSITIONS = _type_table()
+MULTIPLE_CHOICE = 1  # position de "Multiple Choice"
+
+def standards_text(standards):
+    return "\n".join([f"- {standard}: {STANDARDS[standard]}" for standard in standards])
+
+def context_values(params, question_types):
+    # Parties variables du prompt, rendues après le préfixe statique
+    return {
+        "question_types": ", ".join(question_types),
+        "entity_name": params["entity_name"],
+        "survey_title": params["survey_title"],
+        "survey_context": params["survey_context"],
+        "objectives": ", ".join(params["objectives"]),
+        "sector": params["sector"],
+        "target_groups": ", ".join(params["target_groups"]),
+        "target_size": params["target_size"],
+        "sections": params["sections"],
+        "detail_level": params["detail_level"],
+        "duration": params["duration"],
+        "tone": params["tone"],
+        "custom_instructions": params["custom_instructions"] if params["custom_instructions"] else "None"
+    }
+
+@timed("prompt_build", prompt="outline")
+def build_outline_prompt(params, reuse=None):
+    # Convertir la langue du sondage en code interne (ex. "Français" -> "French")
+    survey_lang_code = LANGUAGES[params['survey_lang']]
+    translated_types = [QUESTION_TYPES_TRANSLATED[survey_lang_code].get(t, t) for t in params['question_types']]
+    prefix = outline_prefix(survey_lang_code, params['survey_lang'], standards_text(params["standards"]))
+    prompt = render(prefix, OUTLINE_SUFFIX, **context_values(params, translated_types))
+    if not reuse:
+        return prompt
+    # reuse : questions validées de la banque (question_bank), reprises telles quelles quand elles conviennent
+    listed = "\n".join(f"- {q.text} ({q.type})" for q in reuse)
+    return RenderedPrompt(prompt.prefix, prompt.suffix + f"""Questions already validated in previous surveys. Reuse them word for word where they fit the objectives, and write new questions only for what they do not cover:
+{listed}
+""", prompt.version)
+
+@timed("prompt_build", prompt="survey")
+def build_survey_prompt(params, outline, structured=False):
+    # Déterminer les exigences à inclure dans l’intro
+    if params["standards"]:
+        intro_standards_text = standards_text(params["standards"])
+    else:
+        intro_standards_text = f"- ISO 20252: {STANDARDS['ISO 20252']}"
+    survey_lang_code = LANGUAGES[params['survey_lang']]
+    prefix = survey_prefix(survey_lang_code, params['survey_lang'], standards_text(params["standards"]), intro_standards_text, structured)
+    return render(prefix, SURVEY_SUFFIX, outline=outline, **context_values(params, params['question_types']))
+
+def build_section_prompt(params, section_outline, section_number, total_sections, structured=False):
+    # Prompt d'une seule section : les conditions restent numérotées localement (Q1 = première question de la section)
+    # Les consignes propres à la section vont dans la partie variable pour garder le préfixe commun
+    prompt = build_survey_prompt(params, section_outline, structured=structured)
+    return RenderedPrompt(prompt.prefix, prompt.suffix + f"""This outline is section {section_number} of {total_sections} of a larger survey: generate only the questions of this section.
+Number conditions relative to this section (Q1 is the first question of this section).
+{"Write the survey 'intro'." if section_number == 1 else "Set 'intro' to an empty string."}
+{"Write the survey 'outro'." if section_number == total_sections else "Set 'outro' to an empty string."}
+""", prompt.version)
+
+def build_question_prompt(params, section_outline, lines, section_number, total_sections, structured=False):
+    # Régénération ciblée : seules les lignes modifiées du plan d'une section sont redemandées au modèle
+    prompt = build_survey_prompt(params, section_outline, structured=structured)
+    listed = "\n".join(lines)
+    return RenderedPrompt(prompt.prefix, prompt.suffix + f"""This outline is section {section_number} of {total_sections} of a larger survey. Do not generate the whole section:
+return in 'questions' exactly {len(lines)} question(s), one for each of these outline lines, in this order:
+{listed}
+Number conditions relative to this section (Q1 is the first question listed in the section outline above).
+Set 'intro' and 'outro' to an empty string.
+""", prompt.version)
+
+def build_translation_prompt(texts, source_lang, target_lang):
+    # texts : {id: texte} ; le préfixe ne dépend que de la paire de langues
+    prefix = translation_prefix(LANGUAGES.get(source_lang, source_lang), LANGUAGES.get(target_lang, target_lang))
+    return render(prefix, TRANSLATION_SUFFIX, texts=json.dumps(texts, ensure_ascii=False, indent=0))
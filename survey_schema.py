@@ -0,0 +1,139 @@
+import json
+import re
+
+from metrics import increment, timed
+
+# Schéma unique du questionnaire, partagé par les trois modes de sortie structurée
+# (Ollama format, OpenAI response_format, outil Anthropic)
+SURVEY_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "intro": {"type": "string"},
+        "questions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "type": {"type": "string"},
+                    "text": {"type": "string"},
+                    "options": {"type": ["array", "null"], "items": {"type": "string"}},
+                    "condition": {"type": ["string", "null"]}
+                },
+                "required": ["type", "text", "options", "condition"],
+                "additionalProperties": False
+            }
+        },
+        "outro": {"type": "string"}
+    },
+    "required": ["intro", "questions", "outro"],
+    "additionalProperties": False
+}
+
+SURVEY_TOOL = {
+    "name": "record_survey",
+    "description": "Record the complete survey with its introduction, questions and conclusion.",
+    "input_schema": SURVEY_SCHEMA
+}
+
+CLOSERS = {"{": "}", "[": "]"}
+MAX_REPAIR_ATTEMPTS = 50
+CLOSING = re.compile(r'\s*[}\]]')
+
+
+def _scan(text):
+    # Parcourt le texte une seule fois : pile des crochets ouverts, état "dans une chaîne"
+    # et points de coupure sûrs (virgules au niveau structurel) avec la pile correspondante.
+    stack = []
+    cuts = []
+    end = None
+    in_string = False
+    escaped = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in CLOSERS:
+            stack.append(char)
+        elif char in "}]":
+            if stack:
+                stack.pop()
+                if not stack and end is None:
+                    end = i + 1  # fin de l'objet racine (du texte peut suivre)
+        elif char == ",":
+            cuts.append((i, tuple(stack)))
+    return stack, cuts, end, in_string, escaped
+
+def _strip_trailing_commas(text, cuts):
+    # Virgules finales (",]" ou ",}") au niveau structurel uniquement : le texte des chaînes est conservé
+    trailing = [i for i, _ in cuts if CLOSING.match(text, i + 1)]
+    if not trailing:
+        return text
+    bounds = [-1] + trailing + [len(text)]
+    return "".join(text[bounds[n] + 1:bounds[n + 1]] for n in range(len(bounds) - 1))
+
+def _close(fragment, stack):
+    fragment = re.sub(r',\s*$', '', fragment.rstrip())
+    return fragment + "".join(CLOSERS[c] for c in reversed(stack))
+
+def repair_json(text):
+    # Analyse tolérante d'une sortie JSON tronquée : ferme la chaîne et les crochets ouverts,
+    # puis, si nécessaire, abandonne le dernier élément incomplet plutôt que de régénérer.
+    start = min((i for i in (text.find("{"), text.find("[")) if i != -1), default=-1)
+    if start == -1:
+        raise ValueError("Aucun JSON trouvé dans la réponse.")
+    text = text[start:].rstrip()
+    text = re.sub(r'\s*```\s*$', '', text)
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    stack, cuts, end, in_string, escaped = _scan(text)
+    stripped = _strip_trailing_commas(text, cuts)
+    if stripped != text:
+        text = stripped
+        stack, cuts, end, in_string, escaped = _scan(text)
+    candidates = []
+    if end is not None:
+        candidates.append(text[:end])
+    elif not stack:
+        candidates.append(text)
+    else:
+        tail = text[:-1] if escaped else text
+        candidates.append(_close(tail + ('"' if in_string else ""), stack))
+    candidates.extend(_close(text[:i], list(cut_stack)) for i, cut_stack in reversed(cuts[-MAX_REPAIR_ATTEMPTS:]))
+    for candidate in candidates:
+        try:
+            return json.loads(candidate)
+        except ValueError:
+            continue
+    raise ValueError("JSON invalide et impossible à réparer.")
+
+@timed("json_extraction")
+def parse_survey(response):
+    # Convertit la réponse du modèle en dictionnaire {intro, questions, outro},
+    # en réparant une sortie tronquée au lieu de relancer la génération
+    match = re.search(r'```json\s*(.*?)\s*```', response, re.DOTALL)
+    text = match.group(1) if match else response
+    try:
+        survey = json.loads(text)
+    except ValueError:
+        survey = repair_json(text)
+        increment("survey_json_repairs_total")
+        if isinstance(survey, dict) and isinstance(survey.get("questions"), list):
+            # La dernière question d'une sortie tronquée est souvent incomplète
+            survey["questions"] = [q for q in survey["questions"] if isinstance(q, dict) and q.get("text") and q.get("type")]
+    if not isinstance(survey, dict):
+        raise ValueError("La réponse n'est pas un objet JSON.")
+    # Réponse vide, tronquée dès le début ou message d'erreur ({"error": ...}) : échec, le routeur passe au backend suivant
+    questions = survey.get("questions")
+    if not isinstance(questions, list) or not any(isinstance(q, dict) and q.get("text") for q in questions):
+        raise ValueError("Aucune question exploitable dans la réponse.")
+    survey.setdefault("intro", "")
+    survey.setdefault("outro", "")
+    return survey
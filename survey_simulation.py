@@ -0,0 +1,214 @@
+import json
+import os
+import sys
+from collections import Counter, namedtuple
+
+from survey_model import Condition, as_survey
+from survey_prompts import MULTIPLE_CHOICE, TYPE_POSITIONS
+from survey_validation import Issue
+from metrics import increment, timed
+
+# Prétest par simulation : la logique de saut est compilée une fois, puis des répondants synthétiques
+# parcourent le questionnaire par blocs (numpy, importé à la première simulation). Seules les questions
+# conditionnelles et celles que les conditions consultent sont tirées au sort, répondant par répondant ;
+# les autres sont vues par tous et ne comptent que dans la durée.
+SIMULATION_CELLS = int(os.environ.get("SURVEY_SIMULATION_CELLS", str(1 << 24)))  # cellules (répondants x questions suivies) par bloc
+READING_SECONDS_PER_WORD = 0.3  # ~200 mots par minute
+OPTION_SECONDS = 0.6  # lecture d'une option
+ANSWER_SECONDS = {"single": 2.0, "multiple": 4.0, "open": 30.0}
+SPEED_SIGMA = 0.35  # dispersion (log-normale) de la vitesse des répondants
+ITEM_SIGMA = 0.5  # dispersion du temps passé sur une question
+MIN_ANSWERS = 30  # réponses attendues en dessous desquelles une question est sous-échantillonnée
+TOP_PATHS = 10
+RANDOM_RANGE = 1 << 16
+DISTRIBUTIONS = ["uniform", "varied"]  # varied : poids des options tirés d'une loi de Dirichlet par question
+
+# kind : "single", "multiple" ou "open" ; condition : (question référencée, position de l'option) ou None
+SimQuestion = namedtuple("SimQuestion", ["kind", "options", "seconds", "condition"])
+# reach : part des répondants à qui chaque question est posée ; paths : [(part, questions conditionnelles posées)]
+SimulationReport = namedtuple("SimulationReport", ["respondents", "reach", "unreachable", "paths", "distinct_paths", "durations", "histogram", "low_sample"])
+
+
+def _words(text):
+    return len(text.split())
+
+def compile_skip_logic(survey):
+    # Questions compilées et questions qu'aucun répondant ne peut atteindre (au format des Issue de validation)
+    questions = as_survey(survey).questions
+    compiled, unreachable, blocked = [], [], set()
+    for i, q in enumerate(questions):
+        multiple = TYPE_POSITIONS.get(q.type.strip().lower()) == MULTIPLE_CHOICE or "multiple" in q.type.lower()
+        kind = "open" if not q.options else "multiple" if multiple else "single"
+        seconds = READING_SECONDS_PER_WORD * _words(q.text) + ANSWER_SECONDS[kind] + OPTION_SECONDS * len(q.options or ())
+        condition, reason = None, None
+        parsed = q.parsed
+        if isinstance(parsed, Condition):
+            j = parsed.question
+            if not 0 <= j < len(questions):
+                reason = ("out_of_bounds", "Condition references out-of-bounds question", f" ({parsed.ref})")
+            elif j >= i:
+                reason = ("forward_reference", "Condition references a question that is not asked before it", f" (Q{j+1})")
+            elif j in blocked:
+                reason = ("unreachable_reference", "Condition depends on a question no respondent reaches", f" (Q{j+1})")
+            elif not questions[j].keys:
+                reason = ("no_options_ref", "Referenced question has no options", f" (Q{j+1})")
+            elif parsed.value not in questions[j].key_set:
+                reason = ("invalid_condition_value", "Invalid condition value",
+                          f" ({parsed.raw}) - '{parsed.value}' not in Q{j+1} options: {list(questions[j].options)}")
+            else:
+                condition = (j, questions[j].keys.index(parsed.value))
+        elif parsed is not None:
+            reason = (parsed.key, parsed.default, parsed.detail)
+        if reason:
+            blocked.add(i)
+            unreachable.append(Issue(f"Q{i+1}", *reason))
+        compiled.append(SimQuestion(kind, len(q.options or ()), seconds, condition))
+    return compiled, unreachable
+
+def _answer_model(np, rng, q, custom, distribution, alpha, multi_rate):
+    # Seuils sur un tirage uniforme de 16 bits (précision 1/65536, largement suffisante pour un prétest) :
+    # choix unique : bornes cumulées entre options ; choix multiple : seuil de sélection de chaque option
+    if q.kind == "multiple":
+        p = np.full(q.options, multi_rate) if custom is None else np.resize(np.asarray(custom, dtype=float), q.options)
+        return np.round(np.clip(p, 0.0, 1.0) * RANDOM_RANGE).astype(np.uint32)
+    if custom is not None:
+        weights = np.resize(np.asarray(custom, dtype=float), q.options)
+    elif distribution == "varied":
+        weights = rng.dirichlet(np.full(q.options, alpha))
+    else:
+        weights = np.ones(q.options)
+    return np.round(np.cumsum(weights / weights.sum())[:-1] * RANDOM_RANGE).astype(np.uint32)
+
+@timed("simulation")
+def simulate_survey(survey, respondents=None, target_size=None, duration=None, distribution="uniform", alpha=1.0,
+                    answer_weights=None, multi_rate=0.3, skip_rate=0.0, seed=None, top_paths=TOP_PATHS):
+    # respondents : taille de l'échantillon simulé (target_size par défaut) ; answer_weights : {index de question: poids des options}
+    # skip_rate : part des répondants qui laissent une question sans réponse (ses conditions ne sont alors pas remplies)
+    import numpy as np
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown answer distribution: {distribution}")
+    survey = as_survey(survey)
+    compiled, unreachable = compile_skip_logic(survey)
+    respondents = int(respondents or target_size or 1000)
+    target_size = int(target_size or respondents)
+    rng = np.random.default_rng(seed)
+    count = len(compiled)
+    blocked = {int(issue.prefix[1:]) - 1 for issue in unreachable}
+    conditional = [i for i, q in enumerate(compiled) if q.condition is not None]
+    last_use = {q.condition[0]: i for i, q in enumerate(compiled) if q.condition is not None}
+    tracked = sorted(set(conditional) | set(last_use))
+    bit = {i: n for n, i in enumerate(conditional)}
+    models = {j: _answer_model(np, rng, compiled[j], (answer_weights or {}).get(j), distribution, alpha, multi_rate) for j in last_use}
+    path_keys = rng.integers(1, np.iinfo(np.int64).max, size=count, dtype=np.int64).astype(np.uint64)
+
+    # Questions posées à tous : durée fixe, dispersion approchée par une loi normale (somme de nombreux termes)
+    item_var = np.exp(ITEM_SIGMA ** 2) - 1
+    always = [q.seconds for i, q in enumerate(compiled) if q.condition is None and i not in blocked]
+    always_seconds = sum(always) + READING_SECONDS_PER_WORD * (_words(survey.intro) + _words(survey.outro))
+    always_var = item_var * sum(s * s for s in always)
+
+    reach_counts = np.zeros(count, dtype=np.int64)
+    durations, path_counts, representatives = [], Counter(), {}
+    skip_threshold = round(skip_rate * RANDOM_RANGE)
+    chunk = max(1024, SIMULATION_CELLS // max(1, len(tracked)))
+    for start in range(0, respondents, chunk):
+        n = min(chunk, respondents - start)
+        answers = {}  # question référencée -> (répondu, choix) ; libérée après sa dernière condition
+        # Les masques where= de numpy sont plusieurs fois plus lents qu'une multiplication par le masque booléen
+        cond_seconds = np.zeros(n, dtype=np.float32)
+        cond_var = np.zeros(n, dtype=np.float32)
+        path_hash = np.zeros(n, dtype=np.uint64)
+        shown_matrix = np.zeros((len(conditional), n), dtype=bool)
+        for i in tracked:
+            q = compiled[i]
+            shown = None  # None : question posée à tous
+            if q.condition is not None:
+                j, option = q.condition
+                responded, choice = answers[j]
+                shown = responded & (choice[:, option] if choice.ndim == 2 else choice == option)
+                reach_counts[i] += np.count_nonzero(shown)
+                cond_seconds += shown * np.float32(q.seconds)
+                cond_var += shown * np.float32(q.seconds * q.seconds)
+                path_hash ^= shown * path_keys[i]
+                shown_matrix[bit[i]] = shown
+                if last_use[j] == i:
+                    del answers[j]
+            if i in last_use:
+                responded = np.ones(n, dtype=bool) if shown is None else shown
+                if skip_threshold:
+                    responded = responded & (rng.integers(0, RANDOM_RANGE, n, dtype=np.uint16) >= skip_threshold)
+                if q.kind == "multiple":
+                    choice = rng.integers(0, RANDOM_RANGE, (n, q.options), dtype=np.uint16) < models[i]
+                else:
+                    draw = rng.integers(0, RANDOM_RANGE, n, dtype=np.uint16)
+                    choice = np.zeros(n, dtype=np.uint8)
+                    for threshold in models[i]:
+                        choice += draw >= threshold
+                answers[i] = (responded, choice)
+
+        speed = rng.lognormal(-SPEED_SIGMA ** 2 / 2, SPEED_SIGMA, n)
+        base = always_seconds + cond_seconds
+        noise = rng.standard_normal(n) * np.sqrt(always_var + item_var * cond_var)
+        durations.append((speed * np.maximum(base + noise, 0.2 * base) / 60).astype(np.float32))
+
+        # Parcours distincts : empreinte XOR des questions conditionnelles posées, un représentant par parcours fréquent
+        hashes, first, counts = np.unique(path_hash, return_index=True, return_counts=True)
+        path_counts.update(dict(zip(hashes.tolist(), counts.tolist())))
+        for top in np.argsort(-counts)[:top_paths]:
+            representatives.setdefault(int(hashes[top]), shown_matrix[:, first[top]].copy())
+
+    reach = np.ones(count)
+    reach[conditional] = reach_counts[conditional] / max(respondents, 1)
+    reach[sorted(blocked)] = 0.0
+    paths = []
+    for path, total in path_counts.most_common():
+        if len(paths) >= top_paths:
+            break
+        if path in representatives:
+            paths.append((total / respondents, [conditional[n] for n in np.flatnonzero(representatives[path])]))
+
+    minutes = np.concatenate(durations) if durations else np.zeros(0, dtype=np.float32)
+    stats = {"mean": 0.0, "p5": 0.0, "p50": 0.0, "p95": 0.0, "over_target": None}
+    if len(minutes):
+        p5, p50, p95 = np.percentile(minutes, [5, 50, 95])
+        stats.update(mean=float(minutes.mean()), p5=float(p5), p50=float(p50), p95=float(p95))
+        if duration:
+            stats["over_target"] = float(np.mean(minutes > duration))
+    counts, edges = np.histogram(minutes, bins=30) if len(minutes) else (np.zeros(0), np.zeros(1))
+    low_sample = [i for i in range(count) if 0 < reach[i] * target_size < MIN_ANSWERS]
+    increment("survey_simulated_respondents_total", respondents)
+    return SimulationReport(respondents, reach.tolist(), unreachable, paths, len(path_counts), stats,
+                            (counts.tolist(), edges.tolist()), low_sample)
+
+def report_dict(report):
+    return {
+        "respondents": report.respondents,
+        "reach": report.reach,
+        "unreachable": [issue._asdict() for issue in report.unreachable],
+        "paths": [{"share": share, "conditional_questions": [i + 1 for i in shown]} for share, shown in report.paths],
+        "distinct_paths": report.distinct_paths,
+        "durations": report.durations,
+        "low_sample": [i + 1 for i in report.low_sample]
+    }
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Simulate respondents through a survey's skip logic.")
+    parser.add_argument("input", help="Survey JSON file (intro, questions, outro)")
+    parser.add_argument("-n", "--respondents", type=int, default=100000)
+    parser.add_argument("--target-size", type=int, help="Planned sample size (defaults to --respondents)")
+    parser.add_argument("--duration", type=float, help="Target duration in minutes")
+    parser.add_argument("--distribution", choices=DISTRIBUTIONS, default="uniform")
+    parser.add_argument("--skip-rate", type=float, default=0.0, help="Share of respondents leaving a question unanswered")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+    with open(args.input, encoding="utf-8") as f:
+        survey = json.load(f)
+    report = simulate_survey(survey, args.respondents, args.target_size, args.duration, args.distribution,
+                             skip_rate=args.skip_rate, seed=args.seed)
+    json.dump(report_dict(report), sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+from prompt_templates import RenderedPrompt, prompt_stats, prompt_text
+from survey_model import as_survey
+
+# Historique des questionnaires : configuration, plan, questionnaire généré et tâches de génération
+# (prompt, service, durées). SQLite par défaut ; d'autres backends s'enregistrent dans STORE_BACKENDS.
+STORE_URL = os.environ.get("SURVEY_STORE_URL", "sqlite:///" + os.path.join(".cache", "surveys.sqlite"))
+PAGE_SIZE = 20
+
+# Résumé d'un questionnaire pour les listes (sans les champs volumineux)
+SurveySummary = namedtuple("SurveySummary", ["id", "entity", "title", "survey_type", "language", "service", "question_count", "created_at", "updated_at"])
+SUMMARY_COLUMNS = "id, entity, title, survey_type, language, service, question_count, created_at, updated_at"
+
+
+def fingerprint(config, outline):
+    # Même configuration et même plan : le questionnaire existant peut être repris sans appel au modèle
+    payload = json.dumps([config, outline.strip()], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SQLiteSurveyStore:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Connexion partagée entre les sessions Streamlit ; WAL pour les écritures concurrentes du CLI par lots
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS surveys ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, entity TEXT, title TEXT, survey_type TEXT, language TEXT, "
+            "service TEXT, question_count INTEGER, fingerprint TEXT, search TEXT, "
+            "config TEXT, outline TEXT, survey TEXT, created_at REAL, updated_at REAL);"
+            "CREATE INDEX IF NOT EXISTS idx_surveys_created ON surveys(created_at, id);"
+            "CREATE INDEX IF NOT EXISTS idx_surveys_entity ON surveys(entity, created_at);"
+            "CREATE INDEX IF NOT EXISTS idx_surveys_type ON surveys(survey_type, created_at);"
+            "CREATE INDEX IF NOT EXISTS idx_surveys_language ON surveys(language, created_at);"
+            "CREATE INDEX IF NOT EXISTS idx_surveys_fingerprint ON surveys(fingerprint);"
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, survey_id INTEGER REFERENCES surveys(id) ON DELETE CASCADE, "
+            "kind TEXT, service TEXT, served_by TEXT, status TEXT, prompt TEXT, prompt_version TEXT, prompt_tokens INTEGER, "
+            "error TEXT, queued_at REAL, started_at REAL, finished_at REAL);"
+            "CREATE INDEX IF NOT EXISTS idx_jobs_survey ON jobs(survey_id);"
+        )
+        self._conn.commit()
+
+    def save_survey(self, config, outline, survey, survey_id=None):
+        # Insère un nouveau questionnaire, ou met à jour survey_id (régénération partielle) ; enregistré sous sa forme normalisée
+        now = time.time()
+        survey = as_survey(survey)
+        values = (
+            config.get("entity_name", ""), config.get("survey_title", ""), config.get("survey_context", ""),
+            config.get("survey_lang", ""), config.get("ai_service", ""), len(survey),
+            fingerprint(config, outline), f"{config.get('entity_name', '')} {config.get('survey_title', '')}".lower(),
+            json.dumps(config, ensure_ascii=False, default=str), outline, survey.to_json()
+        )
+        with self._lock:
+            if survey_id is not None:
+                self._conn.execute(
+                    "UPDATE surveys SET entity = ?, title = ?, survey_type = ?, language = ?, service = ?, question_count = ?, "
+                    "fingerprint = ?, search = ?, config = ?, outline = ?, survey = ?, updated_at = ? WHERE id = ?",
+                    values + (now, survey_id)
+                )
+            else:
+                survey_id = self._conn.execute(
+                    "INSERT INTO surveys (entity, title, survey_type, language, service, question_count, fingerprint, search, "
+                    "config, outline, survey, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    values + (now, now)
+                ).lastrowid
+            self._conn.commit()
+        return survey_id
+
+    def record_jobs(self, survey_id, jobs):
+        # Tâches du moteur de génération (generation_engine.Job) rattachées au questionnaire produit
+        rows = []
+        for job in jobs:
+            prompt = job.prompt
+            rows.append((
+                survey_id, job.kind, job.service, job.served_by, job.status, prompt_text(prompt),
+                prompt.version if isinstance(prompt, RenderedPrompt) else None, prompt_stats(prompt)["tokens"],
+                job.error, job.created_at, job.started_at, job.finished_at
+            ))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO jobs (survey_id, kind, service, served_by, status, prompt, prompt_version, prompt_tokens, "
+                "error, queued_at, started_at, finished_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+
+    def get_survey(self, survey_id):
+        with self._lock:
+            row = self._conn.execute("SELECT id, config, outline, survey, created_at FROM surveys WHERE id = ?", (survey_id,)).fetchone()
+        if row is None:
+            return None
+        return {"id": row[0], "config": json.loads(row[1]), "outline": row[2], "survey": json.loads(row[3]), "created_at": row[4]}
+
+    def find_existing(self, config, outline):
+        # Questionnaire déjà généré à partir de la même configuration et du même plan (le plus récent)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {SUMMARY_COLUMNS} FROM surveys WHERE fingerprint = ? ORDER BY created_at DESC LIMIT 1",
+                (fingerprint(config, outline),)
+            ).fetchone()
+        return SurveySummary(*row) if row else None
+
+    def list_surveys(self, entity=None, survey_type=None, language=None, search=None, limit=PAGE_SIZE, before=None):
+        # Pagination par curseur (created_at, id) : coût constant quelle que soit la page, via les index
+        clauses, args = [], []
+        for column, value in (("entity", entity), ("survey_type", survey_type), ("language", language)):
+            if value:
+                clauses.append(f"{column} = ?")
+                args.append(value)
+        if search:
+            clauses.append("search LIKE ?")
+            args.append(f"%{search.lower()}%")
+        if before is not None:
+            clauses.append("(created_at, id) < (?, ?)")
+            args.extend(before)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {SUMMARY_COLUMNS} FROM surveys {where} ORDER BY created_at DESC, id DESC LIMIT ?",
+                args + [limit + 1]
+            ).fetchall()
+        page = [SurveySummary(*row) for row in rows[:limit]]
+        cursor = (page[-1].created_at, page[-1].id) if len(rows) > limit else None
+        return page, cursor
+
+    def distinct(self, column):
+        # Valeurs des filtres (entités, types, langues), lues sur les index
+        if column not in ("entity", "survey_type", "language"):
+            raise ValueError(f"Unknown column: {column}")
+        with self._lock:
+            return [row[0] for row in self._conn.execute(f"SELECT DISTINCT {column} FROM surveys WHERE {column} != '' ORDER BY {column}")]
+
+    def list_jobs(self, survey_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT kind, service, served_by, status, prompt_tokens, error, queued_at, started_at, finished_at "
+                "FROM jobs WHERE survey_id = ? ORDER BY id", (survey_id,)
+            ).fetchall()
+        keys = ["kind", "service", "served_by", "status", "prompt_tokens", "error", "queued_at", "started_at", "finished_at"]
+        return [dict(zip(keys, row)) for row in rows]
+
+    def delete_survey(self, survey_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE survey_id = ?", (survey_id,))
+            self._conn.execute("DELETE FROM surveys WHERE id = ?", (survey_id,))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+STORE_BACKENDS = {"sqlite": lambda location: SQLiteSurveyStore(location)}
+
+def open_store(url=STORE_URL):
+    # "sqlite:///chemin/vers/base.sqlite" ; un autre schéma doit avoir été ajouté à STORE_BACKENDS
+    scheme, _, location = url.partition("://")
+    if scheme not in STORE_BACKENDS:
+        raise ValueError(f"Unsupported survey store: {url}")
+    return STORE_BACKENDS[scheme](location[1:] if location.startswith("/") and scheme == "sqlite" else location)
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = open_store()
+        return _store
@@ -0,0 +1,138 @@
+import os
+
+from generation_engine import DONE, get_engine
+from llm_cache import get_cache
+from survey_prompts import LANGUAGES, QUESTION_TYPES_TRANSLATED, TYPE_POSITIONS, build_translation_prompt
+from survey_schema import repair_json
+from survey_model import normalize_option, parse_condition, ConditionError
+from metrics import increment, timed
+
+# Déclinaison d'un questionnaire maître dans les autres langues : seuls les textes sont traduits
+# (intro, questions, options, outro), par lots soumis au moteur de génération pour toutes les langues cibles.
+# La structure (ordre, sections, nombre d'options, conditions) est recopiée à l'identique.
+TRANSLATION_BATCH = int(os.environ.get("SURVEY_TRANSLATION_BATCH", "40"))  # textes par requête
+
+
+def translate_type(q_type, target_lang):
+    # Les types de question sont traduits sans appel au modèle : même position dans chaque langue
+    position = TYPE_POSITIONS.get(str(q_type).strip().lower())
+    if position is None:
+        return None
+    return list(QUESTION_TYPES_TRANSLATED[LANGUAGES[target_lang]].values())[position]
+
+def survey_texts(survey):
+    # Textes distincts à traduire, dans l'ordre d'apparition
+    texts = [survey.get("intro", ""), survey.get("outro", "")]
+    for q in survey.get("questions", []):
+        texts.append(q.get("text", ""))
+        if str(q.get("type", "")).strip().lower() not in TYPE_POSITIONS:
+            texts.append(q.get("type", ""))
+        for opt in q.get("options") or []:
+            texts.append(opt.get("value", "") if isinstance(opt, dict) else opt)
+    return list(dict.fromkeys(str(t) for t in texts if isinstance(t, str) and t.strip()))
+
+def _cache_key(text, source_lang, target_lang):
+    # Clé indépendante du modèle : une traduction obtenue par un backend sert pour tous
+    return get_cache().make_key("translation", "", text, {"source": source_lang, "target": target_lang})
+
+def _parse_translations(expected):
+    def validate(response):
+        translated = repair_json(response)
+        if not isinstance(translated, dict) or set(translated) != set(expected):
+            raise ValueError("Translation response does not match the requested ids.")
+        return {key: str(value) for key, value in translated.items()}
+    return validate
+
+def plan_translation(texts, source_lang, target_langs, use_cache=True):
+    # Traductions déjà en cache par langue, et lots des textes manquants : [(langue, {identifiant: texte})]
+    cache = get_cache()
+    translations = {}
+    batches = []
+    for lang in target_langs:
+        keys = {_cache_key(text, source_lang, lang): text for text in texts}
+        cached = cache.get_many(list(keys)) if use_cache else {}
+        translations[lang] = {keys[key]: value for key, value in cached.items()}
+        missing = [text for text in texts if text not in translations[lang]]
+        increment("survey_translation_cached_total", len(translations[lang]), language=LANGUAGES.get(lang, lang))
+        for i in range(0, len(missing), TRANSLATION_BATCH):
+            batches.append((lang, {str(n): text for n, text in enumerate(missing[i:i + TRANSLATION_BATCH], 1)}))
+    return translations, batches
+
+def submit_translation(survey, source_lang, target_langs, service, api_keys=None, use_cache=True, fallback=None, engine=None):
+    # Les lots de toutes les langues passent par le moteur de génération : ils partagent les slots
+    # du service (OLLAMA_NUM_PARALLEL...) avec les autres tâches et sessions. Renvoie l'état à suivre.
+    engine = engine or get_engine()
+    targets = [lang for lang in (target_langs or LANGUAGES) if lang != source_lang]
+    translations, batches = plan_translation(survey_texts(survey), source_lang, targets, use_cache)
+    jobs = {}
+    for lang, ids in batches:
+        job_id = engine.submit(build_translation_prompt(ids, source_lang, lang), service, kind="translation", use_cache=use_cache,
+                               api_keys=api_keys, fallback=fallback, validate=_parse_translations(ids))
+        jobs[job_id] = (lang, ids)
+    return {"survey": survey, "source_lang": source_lang, "targets": targets, "translations": translations, "jobs": jobs, "use_cache": use_cache}
+
+def collect_translation(run, engine=None):
+    # {langue: questionnaire} une fois tous les lots terminés (None tant qu'il en reste) ; un lot en échec lève RuntimeError
+    engine = engine or get_engine()
+    jobs = {job_id: engine.get(job_id) for job_id in run["jobs"]}
+    if any(job is not None and not job.finished for job in jobs.values()):
+        return None
+    errors = [job.error or job.status if job is not None else "expired" for job in jobs.values() if job is None or job.status != DONE]
+    if errors:
+        raise RuntimeError("; ".join(dict.fromkeys(errors)))
+    cache = get_cache()
+    translations = run["translations"]
+    for job_id, (lang, ids) in run["jobs"].items():
+        result = {ids[key]: value for key, value in jobs[job_id].result.items()}
+        translations[lang].update(result)
+        if run["use_cache"]:
+            cache.set_many({_cache_key(text, run["source_lang"], lang): value for text, value in result.items()}, "translation")
+    results = {run["source_lang"]: run["survey"]}
+    for lang in run["targets"]:
+        results[lang] = apply_translations(run["survey"], translations[lang], lang)
+    return results
+
+def apply_translations(survey, translations, target_lang):
+    # Recopie la structure du questionnaire maître en remplaçant les seuls textes
+    def tr(text):
+        return translations.get(text, text) if isinstance(text, str) else text
+
+    questions = survey.get("questions", [])
+    translated = []
+    for q in questions:
+        q = dict(q)
+        q["text"] = tr(q.get("text", ""))
+        q["type"] = translate_type(q.get("type", ""), target_lang) or tr(q.get("type", ""))
+        if q.get("options"):
+            q["options"] = [dict(opt, value=tr(opt.get("value", ""))) if isinstance(opt, dict) else tr(opt) for opt in q["options"]]
+        translated.append(q)
+
+    # La valeur d'une condition suit l'option de même position dans la question référencée
+    for source, target in zip(questions, translated):
+        if not source.get("condition"):
+            continue
+        try:
+            condition = parse_condition(source["condition"])
+        except ConditionError:
+            continue
+        if not 0 <= condition.question < len(questions):
+            continue
+        options = [normalize_option(opt) for opt in questions[condition.question].get("options") or []]
+        if condition.value not in options:
+            continue
+        value = translated[condition.question]["options"][options.index(condition.value)]
+        value = value.get("value", "") if isinstance(value, dict) else value
+        if isinstance(source["condition"], dict):
+            target["condition"] = dict(source["condition"], value=value)
+        else:
+            target["condition"] = f"{condition.ref} = {value}"
+    return {"intro": tr(survey.get("intro", "")), "questions": translated, "outro": tr(survey.get("outro", ""))}
+
+@timed("translation")
+def translate_survey(survey, source_lang, target_langs=None, service="Ollama (Local)", api_keys=None, use_cache=True, fallback=None, engine=None):
+    # {langue: questionnaire} pour la langue source et chaque langue cible (attente bloquante des lots)
+    engine = engine or get_engine()
+    run = submit_translation(survey, source_lang, target_langs, service, api_keys, use_cache, fallback, engine)
+    for job_id in run["jobs"]:
+        engine.wait(job_id)
+    return collect_translation(run, engine)
@@ -0,0 +1,158 @@
+import threading
+from collections import OrderedDict, namedtuple
+
+from survey_model import Condition, ConditionError, as_survey, survey_hash
+from metrics import increment, timed
+
+# Moteur de validation sur le modèle typé (survey_model) : options normalisées et conditions analysées
+# à la construction du Survey, résultats mémorisés par empreinte du contenu (Streamlit relance le script
+# à chaque interaction)
+Issue = namedtuple("Issue", ["prefix", "key", "default", "suffix"])
+
+MEMO_SIZE = 128
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def compile_survey(survey):
+    # Index question -> ensemble normalisé des options, et conditions analysées (ou erreur),
+    # déjà calculés par le modèle
+    questions = as_survey(survey).questions
+    return [q.key_set for q in questions], [q.keys for q in questions], [q.parsed for q in questions]
+
+def _find_cycles(edges, count):
+    # Parcours en profondeur itératif sur le graphe question -> question référencée
+    state = [0] * count  # 0 : non visité, 1 : en cours, 2 : terminé
+    cycles = []
+    for root in range(count):
+        if state[root]:
+            continue
+        path = []
+        node = root
+        while node is not None and state[node] == 0:
+            state[node] = 1
+            path.append(node)
+            node = edges.get(node)
+        if node is not None and state[node] == 1:
+            cycles.append(path[path.index(node):])
+        for visited in path:
+            state[visited] = 2
+    return cycles
+
+def _question_issues(i, q, option_index, option_lists, conditions, count):
+    # Problèmes d'une seule question, et la question référencée par sa condition (arête du graphe)
+    q_num = f"Q{i+1}"
+
+    # Vérification des champs obligatoires
+    if not q.text or not q.type:
+        return [Issue(q_num, "missing_field", "Missing required field (text or type)", f" - {q}")], None
+
+    # Vérification des options selon le type
+    q_type = q.type.lower()
+    if "choice" in q_type and not q.options:
+        return [Issue(q_num, "missing_options", "Choice question requires options", f" - {q}")], None
+    if "open" in q_type and q.options is not None:
+        return [Issue(q_num, "unexpected_options", "Open-ended question should not have options", f" - {q}")], None
+
+    # Vérification des conditions (déjà analysées à la compilation)
+    condition = conditions[i]
+    if condition is None:
+        return [], None
+    if isinstance(condition, ConditionError):
+        return [Issue(q_num, condition.key, condition.default, condition.detail)], None
+    cond_idx = condition.question
+    if cond_idx < 0 or cond_idx >= count:
+        return [Issue(q_num, "out_of_bounds", "Condition references out-of-bounds question", f" ({condition.ref})")], None
+    issues = []
+    if cond_idx >= i:
+        issues.append(Issue(q_num, "forward_reference", "Condition references a question that is not asked before it", f" (Q{cond_idx+1})"))
+    if not option_index[cond_idx]:
+        issues.append(Issue(q_num, "no_options_ref", "Referenced question has no options", f" (Q{cond_idx+1})"))
+    elif condition.value not in option_index[cond_idx]:
+        issues.append(Issue(q_num, "invalid_condition_value", "Invalid condition value",
+                            f" ({condition.raw}) - '{condition.value}' not in Q{cond_idx+1} options: {list(option_lists[cond_idx])}"))
+    return issues, cond_idx
+
+def _cycle_issues(edges, count):
+    # Cycles dans la logique de saut (Q3 dépend de Q5 qui dépend de Q3...)
+    issues = []
+    for cycle in _find_cycles(edges, count):
+        if len(cycle) > 1:
+            path = " -> ".join(f"Q{n+1}" for n in cycle + [cycle[0]])
+            issues.append(Issue(f"Q{cycle[0]+1}", "condition_cycle", "Circular skip logic", f" ({path})"))
+    return issues
+
+def _validate(survey):
+    issues = []
+    survey = as_survey(survey)
+    questions = survey.questions
+    if not questions:
+        return [Issue("", "no_questions", "No valid questions found in survey", "")]
+
+    option_index, option_lists, conditions = compile_survey(survey)
+    count = len(questions)
+    edges = {}
+    for i, q in enumerate(questions):
+        question_issues, edge = _question_issues(i, q, option_index, option_lists, conditions, count)
+        issues.extend(question_issues)
+        if edge is not None:
+            edges[i] = edge
+    return issues + _cycle_issues(edges, count)
+
+def _remember(key, issues):
+    with _memo_lock:
+        _memo[key] = issues
+        if len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+
+@timed("validation")
+def validate_survey(survey):
+    key = survey_hash(survey)
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            increment("survey_validation_memo_hits_total")
+            return _memo[key]
+    issues = _validate(survey)
+    _remember(key, issues)
+    return issues
+
+@timed("validation", mode="incremental")
+def revalidate_survey(survey, previous_issues, changed):
+    # Après une régénération partielle : seules les questions modifiées (contenu ou position)
+    # et celles dont la condition les référence sont revérifiées ; les autres gardent leurs problèmes.
+    # Les indices non listés dans changed doivent être restés à la même position.
+    survey = as_survey(survey)
+    questions = survey.questions
+    if previous_issues is None or not questions:
+        return validate_survey(survey)
+    option_index, option_lists, conditions = compile_survey(survey)
+    count = len(questions)
+    changed = {i for i in changed if 0 <= i < count}
+    affected = set(changed)
+    for i, condition in enumerate(conditions):
+        if isinstance(condition, Condition) and condition.question in changed:
+            affected.add(i)
+    issues = [issue for issue in previous_issues
+              if issue.key != "condition_cycle" and issue.prefix.startswith("Q") and int(issue.prefix[1:]) - 1 not in affected and int(issue.prefix[1:]) <= count]
+    # Une question rejetée avant l'examen de sa condition n'entre pas dans le graphe des conditions
+    blocked = {int(issue.prefix[1:]) - 1 for issue in issues if issue.key in ("missing_field", "missing_options", "unexpected_options")}
+    edges = {i: condition.question for i, condition in enumerate(conditions)
+             if i not in affected and i not in blocked and isinstance(condition, Condition) and 0 <= condition.question < count}
+    for i in sorted(affected):
+        question_issues, edge = _question_issues(i, questions[i], option_index, option_lists, conditions, count)
+        issues.extend(question_issues)
+        if edge is not None:
+            edges[i] = edge
+    issues.sort(key=lambda issue: int(issue.prefix[1:]))  # même ordre qu'une validation complète
+    issues += _cycle_issues(edges, count)
+    increment("survey_validation_revalidated_total", len(affected))
+    _remember(survey_hash(survey), issues)
+    return issues
+
+def format_issues(issues, tr=None):
+    tr = tr or {}
+    return [f"{issue.prefix}: {tr.get(issue.key, issue.default)}{issue.suffix}" if issue.prefix else tr.get(issue.key, issue.default) for issue in issues]
+
+def check_consistency(survey, tr=None):
+    return format_issues(validate_survey(survey), tr)